@@ -0,0 +1,42 @@
+"""Add unique index on reading list user and name
+
+Revision ID: 54333b27e6ac
+Revises: d174e92771fc
+Create Date: 2026-10-15 08:17:59.698499
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '54333b27e6ac'
+down_revision: Union[str, Sequence[str], None] = 'd174e92771fc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside a transaction; this keeps Postgres from
+    # locking reading_lists for writes while the index builds.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_reading_list_user_name',
+            'reading_lists',
+            ['user_id', 'list_name'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_reading_list_user_name',
+            table_name='reading_lists',
+            postgresql_concurrently=True,
+        )
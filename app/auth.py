@@ -1,9 +1,12 @@
+import os
 from datetime import datetime, timedelta, timezone
+from anyio import to_thread
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import User
 from app.database import get_db
 
@@ -11,9 +14,18 @@ SECRET_KEY = "your-secret-key"  # Use a secure value in production!
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Work factor for new hashes; tune so one hash costs ~80 ms on the target host.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Built once so SQLAlchemy reuses the memoized cache key and compiled SQL.
+USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+USER_ID_BY_USERNAME = select(User.id).where(User.username == bindparam("username"))
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -26,16 +38,23 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_user(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def get_user(db: AsyncSession, username: str):
+    return await db.scalar(USER_BY_USERNAME, {"username": username})
+
+async def get_user_id(db: AsyncSession, username: str):
+    return await db.scalar(USER_ID_BY_USERNAME, {"username": username})
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user(db, username)
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user(db, username)
+    if not user or not await to_thread.run_sync(
+        verify_password, password, user.hashed_password
+    ):
         return False
     return user
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -48,7 +67,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = get_user(db, username)
+    user = await get_user(db, username)
     if user is None:
         raise credentials_exception
     return user
\ No newline at end of file
@@ -1,20 +1,127 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+import logging
 import os
+import time
+from uuid import uuid4
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./book_library.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    """
+    Swap the driver of a sync database URL for its asyncio counterpart.
+    """
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def engine_options(url: str) -> dict:
+    """
+    Pool and compiled-statement cache settings, overridable through the environment.
+    """
+    options = {"query_cache_size": int(os.getenv("DB_QUERY_CACHE_SIZE", "1200"))}
+    parsed = make_url(url)
+    # In-memory SQLite is served by a StaticPool, which takes no sizing arguments.
+    if not (parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")):
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        )
+    if parsed.get_backend_name() == "postgresql":
+        if os.getenv("DB_PGBOUNCER", "false").lower() == "true":
+            # PgBouncer in transaction mode can hand each transaction a different
+            # server connection, so named prepared statements must not be reused,
+            # and it rejects startup parameters such as statement_timeout.
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        else:
+            # asyncpg takes server settings directly rather than a libpq "options" string.
+            options["connect_args"] = {
+                "server_settings": {
+                    "statement_timeout": os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000")
+                }
+            }
+    return options
+
+
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL", to_async_url(SQLALCHEMY_DATABASE_URL)
+)
+
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL, **engine_options(ASYNC_SQLALCHEMY_DATABASE_URL)
+)
+
+slow_query_log = logging.getLogger("slow_sql")
+SLOW_QUERY_SECONDS = int(os.getenv("DB_SLOW_QUERY_MS", "100")) / 1000
+
+
+# A connection runs one cursor execute at a time, so a single start time per
+# connection is enough; one left behind by a failed statement is overwritten.
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("query_start")
+    if elapsed >= SLOW_QUERY_SECONDS:
+        slow_query_log.warning("%.0f ms: %s", elapsed * 1000, statement)
+
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+DIALECT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+
+def dialect_insert(model):
+    """
+    INSERT construct for the configured backend, exposing on_conflict_do_nothing().
+    """
+    return DIALECT_INSERTS[async_engine.dialect.name](model)
+
+
+def insert_or_ignore(model, **values):
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING the new row.
+    Yields no row when any unique constraint is already taken.
+    Leave values out to execute it with a list of parameter dicts.
+    """
+    stmt = dialect_insert(model)
+    if values:
+        stmt = stmt.values(**values)
+    return stmt.on_conflict_do_nothing().returning(model)
+
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
@@ -0,0 +1,38 @@
+import re
+from hashlib import blake2b
+
+from fastapi import Request, Response
+
+
+# An entity-tag per RFC 9110: optional weakness prefix, then a quoted opaque tag.
+ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+
+
+def make_etag(*parts) -> str:
+    """
+    Build a strong ETag from the values that identify a response's version.
+    """
+    digest = blake2b(":".join(map(str, parts)).encode(), digest_size=8).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """
+    Evaluate If-None-Match with weak comparison (RFC 9110 13.1.2): "*" or any
+    listed tag whose opaque part equals ours, so proxies that weaken tags still match.
+    """
+    if header.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in ENTITY_TAG.findall(header)
+
+
+def not_modified(request: Request, response: Response, etag: str):
+    """
+    Return a 304 response if the client already holds this version,
+    otherwise tag the outgoing response and return None.
+    """
+    header = request.headers.get("if-none-match")
+    if header and etag_matches(header, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
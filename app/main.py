@@ -1,17 +1,23 @@
+import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from alembic.config import Config
-from alembic import command
-from app.database import engine, Base, get_db
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from anyio import to_thread
+from app.database import async_engine, get_db, insert_or_ignore
+from app.migrations import upgrade_to_head
 from app import models
 from app.schemas import (
+    CacheInfo,
+    Message,
+    Token,
     UserCreate,
     UserResponse,
 )
 from datetime import datetime, timezone
 from fastapi import status
-from async_lru import alru_cache
 import logging
 from fastapi.security import OAuth2PasswordRequestForm
 from app.auth import (
@@ -22,14 +28,38 @@ from app.auth import (
 from app.routers import reading_list_router
 from app.routers import book_router
 from app.routers import user_router
-from app.openlibrary import search_openlibrary
+from app.openlibrary import (
+    cached_search_openlibrary,
+    clear_failed_searches,
+    create_http_client,
+    create_redis_client,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    alembic_cfg = Config("alembic.ini")
-    command.upgrade(alembic_cfg, "head")
+    # Set RUN_MIGRATIONS=0 on all but one worker (or when an init job migrates)
+    # so workers don't race on the alembic version table.
+    if os.getenv("RUN_MIGRATIONS", "1") == "1":
+        await to_thread.run_sync(upgrade_to_head)
+    # Only CPU-bound bcrypt hashing runs in threads now that DB access is async;
+    # more threads than cores would just contend for the same CPUs.
+    to_thread.current_default_thread_limiter().total_tokens = int(
+        os.getenv("THREADPOOL_TOKENS", os.cpu_count() or 1)
+    )
+    # openapi() caches the schema on the app, so the first /docs hit doesn't build it.
+    app.openapi()
+    # Open the first pooled connection (and run dialect initialization) now
+    # rather than on the first request; also fails fast if the DB is unreachable.
+    async with async_engine.connect():
+        pass
+    app.state.http = create_http_client()
+    app.state.redis = create_redis_client()
     yield
+    await app.state.http.aclose()
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
+    await async_engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan, title="Library api")
@@ -37,23 +67,35 @@ app.include_router(reading_list_router.router)
 app.include_router(book_router.router)
 app.include_router(user_router.router)
 
-Base.metadata.create_all(bind=engine)
 
-@alru_cache(maxsize=64)
-async def cached_search_openlibrary(title_or_author, author, limit):
-    return await search_openlibrary(title_or_author, author, limit)
+# SQLAlchemy error strings carry the SQL, its bound parameters (password hashes
+# included) and driver messages, so they are logged and never sent to clients.
+@app.exception_handler(IntegrityError)
+async def integrity_error_handler(request: Request, exc: IntegrityError):
+    logging.warning(
+        "Integrity error on %s %s: %s", request.method, request.url.path, exc.orig
+    )
+    return JSONResponse(status_code=400, content={"detail": "Database integrity error."})
 
 
-@app.post("/token")
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+@app.exception_handler(SQLAlchemyError)
+async def database_error_handler(request: Request, exc: SQLAlchemyError):
+    logging.exception(
+        "Database error on %s %s", request.method, request.url.path, exc_info=exc
+    )
+    return JSONResponse(status_code=500, content={"detail": "Internal database error."})
+
+
+@app.post("/token", response_model=Token)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
 ):
-    if not form_data.username or form_data.username.strip() == "":
+    if not form_data.username or form_data.username.isspace():
         raise HTTPException(status_code=400, detail="Username cannot be empty or whitespace.")
-    if not form_data.password or form_data.password.strip() == "":
+    if not form_data.password or form_data.password.isspace():
         raise HTTPException(status_code=400, detail="Password cannot be empty or whitespace.")
 
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     access_token = create_access_token(data={"sub": user.username})
@@ -61,41 +103,36 @@ def login(
 
 
 @app.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """User registration endpoint."""
-    if not user.username or user.username.strip() == "":
-        raise HTTPException(status_code=400, detail="Username cannot be empty.")
-    if not user.email or user.email.strip() == "":
-        raise HTTPException(status_code=400, detail="Email cannot be empty.")
-    if not user.password or user.password.strip() == "":
-        raise HTTPException(status_code=400, detail="Password cannot be empty.")
-
-    username_exists = (
-        db.query(models.User).filter(models.User.username == user.username).first()
+    hashed_password = await to_thread.run_sync(get_password_hash, user.password)
+    now = datetime.now(timezone.utc)
+    db_user = await db.scalar(
+        insert_or_ignore(
+            models.User,
+            username=user.username,
+            email=user.email,
+            hashed_password=hashed_password,
+            created_at=now,
+            updated_at=now,
+        )
     )
-    email_exists = db.query(models.User).filter(models.User.email == user.email).first()
-
-    if username_exists:
-        raise HTTPException(status_code=400, detail="Username already exists.")
-    if email_exists:
+    if db_user is None:
+        result = await db.execute(
+            select(models.User.username, models.User.email).where(
+                or_(models.User.username == user.username, models.User.email == user.email)
+            )
+        )
+        rows = result.all()
+        if any(row.username == user.username for row in rows):
+            raise HTTPException(status_code=400, detail="Username already exists.")
         raise HTTPException(status_code=400, detail="Email already exists.")
 
-    hashed_password = get_password_hash(user.password)
-    now = datetime.now(timezone.utc)
-    db_user = models.User(
-        username=user.username,
-        email=user.email,
-        hashed_password=hashed_password,
-        created_at=now,
-        updated_at=now,
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     return db_user
 
 
-@app.get("/cache/openlibrary/info")
+@app.get("/cache/openlibrary/info", response_model=CacheInfo)
 async def get_openlibrary_cache_info():
     """Get cache statistics for the OpenLibrary search cache."""
     try:
@@ -106,8 +143,15 @@ async def get_openlibrary_cache_info():
         raise HTTPException(status_code=500, detail=f"Cache error: {str(e)}")
 
 
-@app.post("/cache/openlibrary/clear")
+@app.post("/cache/openlibrary/clear", response_model=Message)
 async def clear_openlibrary_cache():
     """Clear the OpenLibrary search cache."""
-    await cached_search_openlibrary.cache_clear()
-    return {"detail": "Cache cleared."}
\ No newline at end of file
+    cached_search_openlibrary.cache_clear()
+    clear_failed_searches()
+    return {"detail": "Cache cleared."}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("app.main:app", loop="uvloop", http="httptools")
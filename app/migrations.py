@@ -0,0 +1,30 @@
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, pool
+
+from app.database import SQLALCHEMY_DATABASE_URL
+
+
+def upgrade_to_head(config_path: str = "alembic.ini") -> bool:
+    """
+    Apply pending migrations. Returns False without running alembic's
+    upgrade (or its logging setup) when the database is already at head.
+    """
+    cfg = Config(config_path)
+    head = ScriptDirectory.from_config(cfg).get_current_head()
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=pool.NullPool)
+    try:
+        with engine.connect() as connection:
+            current = MigrationContext.configure(connection).get_current_revision()
+    finally:
+        engine.dispose()
+    if current == head:
+        return False
+    command.upgrade(cfg, "head")
+    return True
+
+
+if __name__ == "__main__":
+    upgrade_to_head()
@@ -8,6 +8,7 @@ from sqlalchemy import (
     Table,
     CheckConstraint,
     Date,
+    Index,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -48,13 +49,18 @@ class Book(Base):
     __tablename__ = "books"
 
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String(500), index=True, nullable=False)
+    title = Column(String(500), unique=True, index=True, nullable=False)
     author = Column(String(255), index=True, nullable=False)
     isbn = Column(String(13), unique=True, index=True, nullable=False)
     genre = Column(String(100), index=True)
     published_date = Column(Date)
     public_rating = Column(Float)
     description = Column(String(2000))
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
 
     # Relationships
     bookshelf_entries = relationship(
@@ -73,7 +79,7 @@ class Bookshelf(Base):
 
     __tablename__ = "bookshelves"
 
-    READING_STATUSES = ["to_read", "reading", "read", "abandoned"]
+    READING_STATUSES = frozenset({"to_read", "reading", "read", "abandoned"})
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
@@ -82,6 +88,10 @@ class Bookshelf(Base):
     personal_rating = Column(Integer)
     review = Column(String(2000))
     date_added = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(
+        DateTime,
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
 
     __table_args__ = (
         CheckConstraint(
@@ -91,6 +101,7 @@ class Bookshelf(Base):
             "status IN ('to_read', 'reading', 'read', 'abandoned')",
             name="check_status_values",
         ),
+        Index("ix_bookshelf_user_book", "user_id", "book_id", unique=True),
     )
 
     # Relationships
@@ -115,6 +126,10 @@ class ReadingList(Base):
         onupdate=lambda: datetime.now(timezone.utc),
     )
 
+    __table_args__ = (
+        Index("ix_reading_list_user_name", "user_id", "list_name", unique=True),
+    )
+
     # Relationships
     user = relationship("User", back_populates="reading_lists")
     books = relationship(
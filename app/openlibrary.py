@@ -1,7 +1,132 @@
+import logging
+import os
+import time
+from hashlib import blake2b
+
 import httpx
+import orjson
 from fastapi import HTTPException
+from faster_async_lru import alru_cache
+
+# Failed lookups are remembered briefly so a flapping or rate-limited upstream
+# isn't hammered by retries of the same query.
+FAILURE_TTL_SECONDS = 30
+_recent_failures = {}
+
+SEARCH_CACHE_TTL_SECONDS = 900
+
+# Optional cache shared by all workers and kept across restarts; off unless
+# REDIS_URL is set (requires the redis package).
+REDIS_URL = os.getenv("REDIS_URL")
+SHARED_CACHE_TTL_SECONDS = int(os.getenv("OPENLIBRARY_SHARED_CACHE_TTL", "3600"))
+# A stalled Redis should cost a search a fraction of a second, not the
+# library's default of waiting forever; misses fall through to Open Library.
+REDIS_TIMEOUT_SECONDS = 0.25
+
+
+def create_http_client():
+    """
+    Shared client for Open Library calls, pooled and kept alive across requests.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=10,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+
+
+def create_redis_client():
+    """
+    Redis client for the shared search cache, or None when it isn't configured.
+    """
+    if not REDIS_URL:
+        return None
+    from redis.asyncio import Redis
+
+    return Redis.from_url(
+        REDIS_URL,
+        socket_connect_timeout=REDIS_TIMEOUT_SECONDS,
+        socket_timeout=REDIS_TIMEOUT_SECONDS,
+    )
+
+
+def clear_failed_searches():
+    _recent_failures.clear()
+
+
+async def search_openlibrary(title_or_author, author=None, limit=5, client=None):
+    key = (title_or_author, author, limit)
+    now = time.monotonic()
+    failure = _recent_failures.get(key)
+    if failure is not None:
+        expires_at, status_code, detail = failure
+        if expires_at > now:
+            # A fresh exception per hit, so no request holds on to another's traceback.
+            raise HTTPException(status_code=status_code, detail=detail)
+        del _recent_failures[key]
+
+    try:
+        return await _fetch(title_or_author, author, limit, client)
+    except HTTPException as exc:
+        for stale in [k for k, (exp, *_) in _recent_failures.items() if exp <= now]:
+            del _recent_failures[stale]
+        _recent_failures[key] = (now + FAILURE_TTL_SECONDS, exc.status_code, exc.detail)
+        raise
 
-async def search_openlibrary(title_or_author, author=None, limit=5):
+
+def normalize_query(value):
+    """
+    Collapse whitespace and case so equivalent queries share a cache entry.
+    """
+    return " ".join(value.split()).casefold() if value else None
+
+
+def shared_cache_key(title_or_author, author, limit):
+    digest = blake2b(repr((title_or_author, author, limit)).encode(), digest_size=16)
+    return f"openlibrary:search:{digest.hexdigest()}"
+
+
+@alru_cache(maxsize=256, ttl=SEARCH_CACHE_TTL_SECONDS)
+async def cached_search_openlibrary(
+    title_or_author, author, limit, client=None, redis=None
+):
+    """
+    Per-process cache in front of the shared Redis cache, when given,
+    so Redis is only consulted on a local miss.
+    """
+    if redis is None:
+        return await search_openlibrary(title_or_author, author, limit, client=client)
+
+    key = shared_cache_key(title_or_author, author, limit)
+    try:
+        cached = await redis.get(key)
+    except Exception:
+        logging.warning("Shared search cache unavailable", exc_info=True)
+        cached = None
+    if cached is not None:
+        return orjson.loads(cached)
+
+    data = await search_openlibrary(title_or_author, author, limit, client=client)
+    try:
+        await redis.set(key, orjson.dumps(data), ex=SHARED_CACHE_TTL_SECONDS)
+    except Exception:
+        logging.warning("Shared search cache unavailable", exc_info=True)
+    return data
+
+
+async def lookup_openlibrary(
+    title_or_author, author=None, limit=5, client=None, redis=None
+):
+    """
+    Cached Open Library search, keyed on the normalized query.
+    """
+    title_or_author, author = normalize_query(title_or_author), normalize_query(author)
+    return await cached_search_openlibrary(
+        title_or_author, author, limit, client=client, redis=redis
+    )
+
+
+async def _fetch(title_or_author, author, limit, client):
     url = "https://openlibrary.org/search.json"
     params = {"limit": limit}
     if author:
@@ -10,19 +135,24 @@ async def search_openlibrary(title_or_author, author=None, limit=5):
         params["q"] = title_or_author
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
+        if client is None:
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.get(url, params=params)
+        else:
             response = await client.get(url, params=params)
-            if response.status_code == 429:
-                raise HTTPException(
-                    status_code=503,
-                    detail="Open Library API rate limit exceeded. Please try again later.",
-                )
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Open Library API error: {response.status_code} {response.reason_phrase}",
-                )
-            return response.json()
+        if response.status_code == 429:
+            raise HTTPException(
+                status_code=503,
+                detail="Open Library API rate limit exceeded. Please try again later.",
+            )
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Open Library API error: {response.status_code} {response.reason_phrase}",
+            )
+        return orjson.loads(response.content)
+    except HTTPException:
+        raise
     except httpx.RequestError as exc:
         raise HTTPException(
             status_code=502,
@@ -32,4 +162,4 @@ async def search_openlibrary(title_or_author, author=None, limit=5):
         raise HTTPException(
             status_code=500,
             detail=f"Unexpected error: {exc}",
-        )
\ No newline at end of file
+        )
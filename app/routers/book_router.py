@@ -1,179 +1,205 @@
+import asyncio
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app.database import get_db
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Path, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, union
+from app.database import get_db, insert_or_ignore
 from app import models
-from app.schemas import BookCreate, BookResponse
-from app.openlibrary import search_openlibrary
-from async_lru import alru_cache
+from app.schemas import BookCreate, BookPage, BookResponse, BookSearchResponse
+from app.openlibrary import lookup_openlibrary
 from app.auth import get_current_user
+from app.etag import make_etag, not_modified
 
 router = APIRouter(prefix="/books", tags=["books"])
 
-@alru_cache(maxsize=64)
-async def cached_search_openlibrary(title_or_author, author, limit):
-    return await search_openlibrary(title_or_author, author, limit)
+BOOKS_BULK_LIMIT = 1000
+BULK_INSERT_BATCH_SIZE = 10_000
+BOOKS_CACHE_CONTROL = "private, max-age=30"
+BOOK_RESPONSE_COLUMNS = (
+    models.Book.id,
+    models.Book.title,
+    models.Book.author,
+    models.Book.isbn,
+    models.Book.genre,
+    models.Book.description,
+    models.Book.published_date,
+)
 
-@router.get("/search")
+def _map_doc(doc):
+    """
+    Map one Open Library search doc onto the ExternalBook fields.
+    """
+    authors = doc.get("author_name")
+    isbns = doc.get("isbn")
+    subjects = doc.get("subject")
+    return {
+        "title": doc.get("title"),
+        "author": ", ".join(authors) if authors else None,
+        "isbn": isbns[0] if isbns else None,
+        "genre": ", ".join(subjects) if subjects else None,
+        "published_date": doc.get("first_publish_year"),
+    }
+
+@router.get("/search", response_model=BookSearchResponse)
 async def get_book_by_name_or_author(
+    request: Request,
     title: Optional[str] = Query(None, description="Book title"),
     author: Optional[str] = Query(None, description="Author name"),
     limit: int = Query(5, ge=1, le=20, description="Max results"),
     external: bool = Query(False, description="Search on Open Library if true."),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Search for books by title or author.
     Also searchs on Open Library Api if true.
     """
-    if (title is None or title.strip() == "") and (
-        author is None or author.strip() == ""
+    if (not title or title.isspace()) and (
+        not author or author.isspace()
     ):
         raise HTTPException(
             status_code=400,
             detail="You must provide at least a non-empty title or author.",
         )
 
-    try:
-        query = db.query(models.Book)
-        if title and author:
-            query = query.filter(
-                or_(models.Book.title == title, models.Book.author == author)
-            )
-        elif title:
-            query = query.filter(models.Book.title == title)
-        elif author:
-            query = query.filter(models.Book.author == author)
-        books = query.all()
-
-        local_results = [
-            BookResponse.model_validate(book).model_dump() for book in books
-        ]
+    # A UNION lets each branch probe its own index instead of an OR scan.
+    by_title = select(*BOOK_RESPONSE_COLUMNS).where(models.Book.title == title)
+    by_author = select(*BOOK_RESPONSE_COLUMNS).where(models.Book.author == author)
+    if title and author:
+        stmt = union(by_title, by_author)
+    elif title:
+        stmt = by_title
+    else:
+        stmt = by_author
 
-        external_results = []
-        if external:
-            data = await cached_search_openlibrary(title or author, author, limit)
-            for doc in data.get("docs", []):
-                external_results.append(
-                    {
-                        "title": doc.get("title"),
-                        "author": (
-                            ", ".join(doc.get("author_name", []))
-                            if doc.get("author_name")
-                            else None
-                        ),
-                        "isbn": doc.get("isbn", [None])[0] if doc.get("isbn") else None,
-                        "genre": (
-                            ", ".join(doc.get("subject", []))
-                            if doc.get("subject")
-                            else None
-                        ),
-                        "published_date": doc.get("first_publish_year"),
-                    }
-                )
-
-        if not local_results and not external:
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "message": "No data found locally.",
-                    "local": [],
-                    "external": [],
-                },
+    external_results = []
+    if external:
+        # The local query and the Open Library call are independent; overlap them.
+        local_task = asyncio.ensure_future(db.execute(stmt))
+        try:
+            data = await lookup_openlibrary(
+                title or author,
+                author,
+                limit,
+                client=getattr(request.app.state, "http", None),
+                redis=getattr(request.app.state, "redis", None),
             )
+        except BaseException:
+            # The session can't be rolled back while the query still holds it,
+            # so let the query settle before the lookup error propagates.
+            await asyncio.gather(local_task, return_exceptions=True)
+            raise
+        local_results = (await local_task).all()
+        external_results = [_map_doc(doc) for doc in data.get("docs", ())]
+    else:
+        local_results = (await db.execute(stmt)).all()
 
-        return {
-            "local": local_results,
-            "external": external_results,
-        }
-    except HTTPException:
-        raise
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if not local_results and not external:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "message": "No data found locally.",
+                "local": [],
+                "external": [],
+            },
+        )
 
-@router.get("", response_model=list[BookResponse])
-def get_all_books(
-    page: int = Query(..., gt=0, description="Page number"),
-    db: Session = Depends(get_db),
+    return {
+        "local": local_results,
+        "external": external_results,
+    }
+
+@router.get("", response_model=BookPage)
+async def get_all_books(
+    request: Request,
+    response: Response,
+    after_id: Optional[int] = Query(None, description="Return books after this ID"),
+    limit: int = Query(20, ge=1, le=100, description="Page size"),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    Get all locally stored books.
+    Get all locally stored books, paginated by ID cursor.
     """
-    try:
-        page_size = 20
-        offset = (page - 1) * page_size
-        books = db.query(models.Book).offset(offset).limit(page_size)
-        return books
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    window = select(models.Book.id, models.Book.updated_at).order_by(models.Book.id).limit(limit)
+    if after_id is not None:
+        window = window.where(models.Book.id > after_id)
+    window = window.subquery()
+    version = (
+        await db.execute(
+            select(func.count(), func.max(window.c.id), func.max(window.c.updated_at))
+        )
+    ).one()
+    cached = not_modified(
+        request, response, make_etag("books", after_id, limit, *version)
+    )
+    if cached:
+        cached.headers["Cache-Control"] = BOOKS_CACHE_CONTROL
+        return cached
+    response.headers["Cache-Control"] = BOOKS_CACHE_CONTROL
+
+    stmt = select(*BOOK_RESPONSE_COLUMNS).order_by(models.Book.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.where(models.Book.id > after_id)
+    books = (await db.execute(stmt)).all()
+    next_cursor = books[-1].id if len(books) == limit else None
+    return {"items": books, "next_cursor": next_cursor}
 
 @router.post("", response_model=BookResponse)
-def create_book(
+async def create_book(
     book: BookCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Create a book to be stored locally.
     """
-    for field_name in ["title", "author", "isbn", "genre", "description"]:
-        value = getattr(book, field_name)
-        if not value or value.strip() == "":
-            raise HTTPException(
-                status_code=400,
-                detail=f"{field_name.capitalize()} cannot be empty or whitespace.",
-            )
-    try:
-        existing_book = (
-            db.query(models.Book)
-            .filter((models.Book.isbn == book.isbn) | (models.Book.title == book.title))
-            .first()
+    db_book = await db.scalar(insert_or_ignore(models.Book, **book.model_dump()))
+    if db_book is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Book with ISBN '{book.isbn}' or title '{book.title}' already exists",
         )
-        if existing_book:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Book with ISBN '{book.isbn}' or title '{book.title}' already exists",
-            )
+    await db.commit()
+    return db_book
+
+@router.post("/bulk", response_model=list[BookResponse])
+async def create_books_bulk(
+    books: list[BookCreate] = Body(..., max_length=BOOKS_BULK_LIMIT),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Create many books in one transaction.
+    Books whose ISBN or title already exists are skipped.
+    """
+    seen_isbns, seen_titles, payload = set(), set(), []
+    for book in books:
+        if book.isbn in seen_isbns or book.title in seen_titles:
+            continue
+        seen_isbns.add(book.isbn)
+        seen_titles.add(book.title)
+        payload.append(book.model_dump())
 
-        db_book = models.Book(
-            title=book.title,
-            author=book.author,
-            isbn=book.isbn,
-            genre=book.genre,
-            description=book.description,
-            published_date=book.published_date,
+    created = []
+    for start in range(0, len(payload), BULK_INSERT_BATCH_SIZE):
+        batch = payload[start : start + BULK_INSERT_BATCH_SIZE]
+        created.extend(
+            (await db.scalars(insert_or_ignore(models.Book), batch)).all()
         )
-        db.add(db_book)
-        db.commit()
-        db.refresh(db_book)
-        return db_book
-    except HTTPException:
-        raise
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    await db.commit()
+    return created
 
 @router.delete("/{id}", response_model=BookResponse)
-def delete_book(
+async def delete_book(
     id: int = Path(..., description="Book ID"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Delete locally stored book by its ID.
     """
-    try:
-        book_to_delete = db.query(models.Book).filter(models.Book.id == id).first()
-        if not book_to_delete:
-            raise HTTPException(status_code=404, detail="Book not found.")
-        db.delete(book_to_delete)
-        db.commit()
-        return book_to_delete
-    except HTTPException:
-        raise
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
\ No newline at end of file
+    book_to_delete = await db.get(models.Book, id)
+    if not book_to_delete:
+        raise HTTPException(status_code=404, detail="Book not found.")
+    await db.delete(book_to_delete)
+    await db.commit()
+    return book_to_delete
@@ -1,161 +1,168 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
-from sqlalchemy.orm import Session
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.database import get_db, insert_or_ignore
 from app import models
-from app.schemas import ReadingListResponse, ReadingListBookEntry
-from app.auth import get_current_user
+from app.schemas import ReadingListResponse
+from app.auth import get_current_user, get_user_id
+from app.etag import make_etag, not_modified
 
 router = APIRouter(prefix="/users", tags=["reading-lists"])
 
 
 def dont_allow_empty_user(username):
-    if not username or username.strip() == "":
+    if not username or username.isspace():
         raise HTTPException(
             status_code=400, detail="You must provide a non-empty username."
         )
 
 
+def reading_list_data(reading_list, username, books):
+    """
+    Plain response data; response_model validates it once on the way out.
+    """
+    return {
+        "id": reading_list.id,
+        "username": username,
+        "reading_list_name": reading_list.list_name,
+        "books": [
+            {
+                "id": book.id,
+                "book_id": book.id,
+                "title": book.title,
+                "author": book.author,
+            }
+            for book in books
+        ],
+    }
+
+
 @router.post("/readinglists", response_model=ReadingListResponse)
-def create_reading_list(
+async def create_reading_list(
     username: str = Query(..., description="Username"),
     name: str = Query(..., description="Reading list name"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Create readinglist by book id.
     """
     dont_allow_empty_user(username)
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
+    # One round-trip resolves the user and up to three of their list names,
+    # which is all both checks below need.
+    rows = (
+        await db.execute(
+            select(models.User.id, models.ReadingList.list_name)
+            .outerjoin(models.ReadingList, models.ReadingList.user_id == models.User.id)
+            .where(models.User.username == username)
+            .limit(3)
+        )
+    ).all()
+    if not rows:
         raise HTTPException(status_code=404, detail="User not found.")
+    user_id = rows[0].id
+    list_names = [row.list_name for row in rows if row.list_name is not None]
 
-    count = (
-        db.query(models.ReadingList)
-        .filter(models.ReadingList.user_id == user.id)
-        .count()
-    )
-    if count >= 3:
+    if len(list_names) >= 3:
         raise HTTPException(
             status_code=400, detail="User can have 3 reading lists simultaneously."
         )
-
-    existing = (
-        db.query(models.ReadingList)
-        .filter(
-            models.ReadingList.user_id == user.id, models.ReadingList.list_name == name
+    # The unique (user_id, list_name) index also catches a concurrent create.
+    reading_list = None
+    if name not in list_names:
+        reading_list = await db.scalar(
+            insert_or_ignore(models.ReadingList, user_id=user_id, list_name=name)
         )
-        .first()
-    )
-    if existing:
+    if reading_list is None:
         raise HTTPException(
             status_code=400, detail="Reading list with this name already exists."
         )
+    await db.commit()
 
-    reading_list = models.ReadingList(user_id=user.id, list_name=name)
-    db.add(reading_list)
-    db.commit()
-    db.refresh(reading_list)
-
-    return ReadingListResponse(
-        id=reading_list.id,
-        username=user.username,
-        reading_list_name=reading_list.list_name,
-        books=[],
-    )
+    return reading_list_data(reading_list, username, [])
 
 
 @router.get("/readinglists/", response_model=list[ReadingListResponse])
-def get_reading_lists(
+async def get_reading_lists(
+    request: Request,
+    response: Response,
     username: str = Query(..., description="Username"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Get users readinglists by username.
     """
     dont_allow_empty_user(username)
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
+    user_id = await get_user_id(db, username)
+    if user_id is None:
         raise HTTPException(status_code=404, detail="User not found.")
 
-    reading_lists = (
-        db.query(models.ReadingList).filter(models.ReadingList.user_id == user.id).all()
+    rlb = models.reading_list_books
+    version = (
+        await db.execute(
+            select(
+                func.count(func.distinct(models.ReadingList.id)),
+                func.max(models.ReadingList.id),
+                func.max(models.ReadingList.updated_at),
+                func.count(rlb.c.book_id),
+                func.max(rlb.c.date_added),
+            )
+            .select_from(models.ReadingList)
+            .outerjoin(rlb, rlb.c.reading_list_id == models.ReadingList.id)
+            .where(models.ReadingList.user_id == user_id)
+        )
+    ).one()
+    cached = not_modified(
+        request, response, make_etag("readinglists", username, user_id, *version)
     )
+    if cached:
+        return cached
 
-    result = []
-
-    for rl in reading_lists:
-        books = [
-            ReadingListBookEntry(
-                id=book.id,
-                book_id=book.id,
-                title=book.title,
-                author=book.author,
-            )
-            for book in rl.books
-        ]
-        result.append(
-            ReadingListResponse(
-                id=rl.id,
-                username=user.username,
-                reading_list_name=rl.list_name,
-                books=books,
-            )
+    reading_lists = (
+        await db.scalars(
+            select(models.ReadingList)
+            .options(selectinload(models.ReadingList.books))
+            .where(models.ReadingList.user_id == user_id)
         )
-    return result
+    ).all()
+
+    return [reading_list_data(rl, username, rl.books) for rl in reading_lists]
 
 
 @router.delete("/readinglists/{name}", response_model=ReadingListResponse)
-def delete_reading_list(
+async def delete_reading_list(
     username: str = Query(..., description="Username"),
     name: str = Path(..., description="Reading list name"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Delete reading list by name.
     """
     dont_allow_empty_user(username)
-    if not name or name.strip() == "":
+    if not name or name.isspace():
         raise HTTPException(
             status_code=400, detail="You must provide a non-empty reading list name."
         )
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
+    user_id = await get_user_id(db, username)
+    if user_id is None:
         raise HTTPException(status_code=404, detail="User not found.")
 
-    reading_list = (
-        db.query(models.ReadingList)
-        .filter(
-            models.ReadingList.user_id == user.id, models.ReadingList.list_name == name
+    reading_list = await db.scalar(
+        select(models.ReadingList)
+        .options(selectinload(models.ReadingList.books))
+        .where(
+            models.ReadingList.user_id == user_id, models.ReadingList.list_name == name
         )
-        .first()
     )
     if not reading_list:
         raise HTTPException(status_code=404, detail="Reading list not found.")
 
-    books = [
-        ReadingListBookEntry(
-            id=book.id,
-            book_id=book.id,
-            title=book.title,
-            author=book.author,
-        )
-        for book in reading_list.books
-    ]
-    response = ReadingListResponse(
-        id=reading_list.id,
-        username=user.username,
-        reading_list_name=reading_list.list_name,
-        books=books,
-    )
+    response = reading_list_data(reading_list, username, reading_list.books)
 
-    try:
-        db.delete(reading_list)
-        db.commit()
-        return response
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
\ No newline at end of file
+    await db.delete(reading_list)
+    await db.commit()
+    return response
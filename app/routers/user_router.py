@@ -1,159 +1,146 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
-from sqlalchemy.orm import Session
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request, Response
+from sqlalchemy import bindparam, exists, func, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from app.database import dialect_insert, get_db, insert_or_ignore
 from app import models
 from app.schemas import (
     UserCreate,
     UserResponse,
+    UserPage,
+    BookshelfEntryCreate,
     BookshelfResponse,
-    BookshelfEntry,
 )
 from app.models import Bookshelf
 from datetime import datetime, timezone
-from app.auth import get_current_user
+from app.auth import get_current_user, get_user_id
+from app.etag import make_etag, not_modified
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+BOOKSHELF_BULK_LIMIT = 1000
 
-def find_user_by_username_or_email(
-    db: Session, username: Optional[str], email: Optional[str]
+BOOKSHELF_ENTRY_WITH_BOOK = (
+    select(Bookshelf)
+    .options(joinedload(Bookshelf.book))
+    .where(
+        Bookshelf.user_id == bindparam("user_id"),
+        Bookshelf.book_id == bindparam("book_id"),
+    )
+)
+BOOKSHELF_ROWS = (
+    select(
+        Bookshelf.id,
+        Bookshelf.book_id,
+        models.Book.title,
+        models.Book.author,
+        Bookshelf.status,
+        Bookshelf.date_added.label("added_date"),
+    )
+    .join(models.Book, Bookshelf.book_id == models.Book.id)
+    .where(Bookshelf.user_id == bindparam("user_id"))
+)
+USER_RESPONSE_COLUMNS = (
+    models.User.id,
+    models.User.username,
+    models.User.email,
+    models.User.created_at,
+    models.User.updated_at,
+)
+
+
+async def find_user_by_username_or_email(
+    db: AsyncSession, username: Optional[str], email: Optional[str]
 ):
     """
     Helper function to find a user by username and/or email.
     """
-    query = db.query(models.User)
+    query = select(models.User)
     if username and email:
-        return query.filter(
-            models.User.username == username, models.User.email == email
-        ).first()
+        return await db.scalar(
+            query.where(models.User.username == username, models.User.email == email)
+        )
     elif username:
-        return query.filter(models.User.username == username).first()
+        return await db.scalar(query.where(models.User.username == username))
     elif email:
-        return query.filter(models.User.email == email).first()
+        return await db.scalar(query.where(models.User.email == email))
     return None
 
 
 def dont_allow_empty_user(username):
-    if not username or username.strip() == "":
+    if not username or username.isspace():
         raise HTTPException(
             status_code=400, detail="You must provide a non-empty username."
         )
 
 
-@router.get("", response_model=list[UserResponse])
-def get_all_users(
-    page: int = Query(..., gt=0, description="Page number"),
-    db: Session = Depends(get_db),
+@router.get("", response_model=UserPage)
+async def get_all_users(
+    after_id: Optional[int] = Query(None, description="Return users after this ID"),
+    limit: int = Query(20, ge=1, le=100, description="Page size"),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
-    Retrieve a paginated list of all users.
+    Retrieve all users, paginated by ID cursor.
     """
-    try:
-        page_size = 20
-        offset = (page - 1) * page_size
-        users = db.query(models.User).offset(offset).limit(page_size).all()
-        return users
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    stmt = select(*USER_RESPONSE_COLUMNS).order_by(models.User.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.where(models.User.id > after_id)
+    users = (await db.execute(stmt)).all()
+    next_cursor = users[-1].id if len(users) == limit else None
+    return {"items": users, "next_cursor": next_cursor}
 
 
 @router.get("/search", response_model=UserResponse)
-def get_user(
+async def get_user(
     username: Optional[str] = Query(None, description="Username"),
     email: Optional[str] = Query(None, description="Email"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Search user by name or email.
     """
-    if (not username or username.strip() == "") and (not email or email.strip() == ""):
+    if (not username or username.isspace()) and (not email or email.isspace()):
         raise HTTPException(
             status_code=400, detail="You must provide a non-empty username or email."
         )
-    try:
-        user = find_user_by_username_or_email(db, username, email)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found.")
-        return user
-    except HTTPException:
-        raise
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    user = await find_user_by_username_or_email(db, username, email)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+    return user
 
 
 @router.delete("", response_model=UserResponse)
-def delete_user(
+async def delete_user(
     username: Optional[str] = Query(None, description="Username"),
     email: Optional[str] = Query(None, description="Email"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Delete user by id.
     """
-    if (not username or username.strip() == "") and (not email or email.strip() == ""):
+    if (not username or username.isspace()) and (not email or email.isspace()):
         raise HTTPException(
             status_code=400, detail="You must provide a non-empty username or email."
         )
-    try:
-        user = find_user_by_username_or_email(db, username, email)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found.")
-        db.delete(user)
-        db.commit()
-        return user
-    except HTTPException:
-        raise
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-
-
-@router.put("/{id}", response_model=UserResponse)
-def update_user(
-    id: int,
-    user_update: UserCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
-):
-    """
-    Update user by id.
-    """
-    user = db.query(models.User).filter(models.User.id == id).first()
+    user = await find_user_by_username_or_email(db, username, email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found.")
-
-    if user_update.username != user.username:
-        if (
-            db.query(models.User)
-            .filter(models.User.username == user_update.username)
-            .first()
-        ):
-            raise HTTPException(status_code=400, detail="Username already exists.")
-    if user_update.email != user.email:
-        if db.query(models.User).filter(models.User.email == user_update.email).first():
-            raise HTTPException(status_code=400, detail="Email already exists.")
-
-    user.username = user_update.username
-    user.email = user_update.email
-    user.updated_at = datetime.now(timezone.utc)
-
-    db.commit()
-    db.refresh(user)
+    await db.delete(user)
+    await db.commit()
     return user
 
 
 @router.post("/bookshelf", response_model=BookshelfResponse)
-def add_book_to_bookshelf(
+async def add_book_to_bookshelf(
     username: str = Query(..., description="Username"),
     book_id: int = Query(..., description="Book ID"),
     status: str = Query("to_read", description="Reading status"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
@@ -161,39 +148,52 @@ def add_book_to_bookshelf(
     """
     dont_allow_empty_user(username)
 
-    if not status or status.strip() == "":
+    if not status or status.isspace():
         raise HTTPException(
             status_code=400, detail="Status cannot be blank or whitespace."
         )
     if status not in Bookshelf.READING_STATUSES:
         raise HTTPException(status_code=400, detail=f"Invalid status: {status}")
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found.")
-    book = db.query(models.Book).filter(models.Book.id == book_id).first()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found.")
-
-    existing = (
-        db.query(Bookshelf)
-        .filter(Bookshelf.user_id == user.id, Bookshelf.book_id == book.id)
-        .first()
+    # Resolve the user and book inside the insert itself; only a miss needs a
+    # second query to tell which of them was absent.
+    source = (
+        select(
+            models.User.id,
+            models.Book.id,
+            literal(status),
+            literal(datetime.now(timezone.utc).date(), Bookshelf.date_added.type),
+        )
+        .select_from(models.User)
+        .join(models.Book, models.Book.id == book_id)
+        .where(models.User.username == username)
     )
-    if existing:
-        raise HTTPException(status_code=400, detail="Book already in user's bookshelf.")
-
-    added_date = datetime.now(timezone.utc).date()
-
-    bookshelf_entry = Bookshelf(
-        user_id=user.id,
-        book_id=book.id,
-        status=status,
-        date_added=added_date,
+    bookshelf_entry = await db.scalar(
+        dialect_insert(Bookshelf)
+        .from_select(["user_id", "book_id", "status", "date_added"], source)
+        .on_conflict_do_nothing()
+        .returning(Bookshelf)
     )
-    db.add(bookshelf_entry)
-    db.commit()
-    db.refresh(bookshelf_entry)
+    if bookshelf_entry is None:
+        found = (
+            await db.execute(
+                select(
+                    select(models.User.id)
+                    .where(models.User.username == username)
+                    .scalar_subquery(),
+                    select(models.Book.id)
+                    .where(models.Book.id == book_id)
+                    .scalar_subquery(),
+                )
+            )
+        ).one()
+        if found[0] is None:
+            raise HTTPException(status_code=404, detail="User not found.")
+        if found[1] is None:
+            raise HTTPException(status_code=404, detail="Book not found.")
+        raise HTTPException(status_code=400, detail="Book already in user's bookshelf.")
+    await db.commit()
+    book = await db.get(models.Book, book_id)
 
     bookshelf = [
         {
@@ -206,87 +206,214 @@ def add_book_to_bookshelf(
         }
     ]
 
-    return {"username": user.username, "bookshelf": bookshelf}
+    return {"username": username, "bookshelf": bookshelf}
 
 
-@router.get("/bookshelf", response_model=BookshelfResponse)
-def get_user_bookshelf(
+@router.post("/bookshelf/bulk", response_model=BookshelfResponse)
+async def add_books_to_bookshelf(
     username: str = Query(..., description="Username"),
-    db: Session = Depends(get_db),
+    entries: list[BookshelfEntryCreate] = Body(..., max_length=BOOKSHELF_BULK_LIMIT),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
-    Get user bookshelf data list.
+    Add many books to a bookshelf in one transaction.
+    Books already on the shelf are skipped.
     """
     dont_allow_empty_user(username)
+    invalid = sorted({entry.status for entry in entries} - Bookshelf.READING_STATUSES)
+    if invalid:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid status: {', '.join(invalid)}"
+        )
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
+    user_id = await get_user_id(db, username)
+    if user_id is None:
         raise HTTPException(status_code=404, detail="User not found.")
 
-    bookshelf_entries = (
-        db.query(models.Bookshelf).filter(models.Bookshelf.user_id == user.id).all()
+    statuses = {}
+    for entry in entries:
+        statuses.setdefault(entry.book_id, entry.status)
+
+    result = await db.execute(
+        select(models.Book.id, models.Book.title, models.Book.author).where(
+            models.Book.id.in_(statuses)
+        )
     )
+    books = {row.id: row for row in result}
+    missing = sorted(statuses.keys() - books.keys())
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Books not found: {', '.join(map(str, missing))}",
+        )
+
+    added = []
+    if statuses:
+        today = datetime.now(timezone.utc).date()
+        added = (
+            await db.scalars(
+                insert_or_ignore(Bookshelf),
+                [
+                    {
+                        "user_id": user_id,
+                        "book_id": book_id,
+                        "status": status,
+                        "date_added": today,
+                    }
+                    for book_id, status in statuses.items()
+                ],
+            )
+        ).all()
+    await db.commit()
+
     bookshelf = [
         {
             "id": entry.id,
-            "book_id": entry.book.id,
-            "title": entry.book.title,
-            "author": entry.book.author,
+            "book_id": entry.book_id,
+            "title": books[entry.book_id].title,
+            "author": books[entry.book_id].author,
             "status": entry.status,
             "added_date": entry.date_added,
         }
-        for entry in bookshelf_entries
+        for entry in added
     ]
-    return {"username": user.username, "bookshelf": bookshelf}
+    return {"username": username, "bookshelf": bookshelf}
+
+
+@router.get("/bookshelf", response_model=BookshelfResponse)
+async def get_user_bookshelf(
+    request: Request,
+    response: Response,
+    username: str = Query(..., description="Username"),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Get user bookshelf data list.
+    """
+    dont_allow_empty_user(username)
+
+    user_id = await get_user_id(db, username)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found.")
+
+    version = (
+        await db.execute(
+            select(
+                func.count(Bookshelf.id),
+                func.max(Bookshelf.id),
+                func.max(Bookshelf.updated_at),
+            ).where(Bookshelf.user_id == user_id)
+        )
+    ).one()
+    cached = not_modified(
+        request, response, make_etag("bookshelf", username, user_id, *version)
+    )
+    if cached:
+        return cached
+
+    result = await db.execute(BOOKSHELF_ROWS, {"user_id": user_id})
+    bookshelf = result.mappings().all()
+    return {"username": username, "bookshelf": bookshelf}
 
 
 @router.put("/bookshelf", response_model=BookshelfResponse)
-def update_bookshelf_status(
+async def update_bookshelf_status(
     username: str = Query(..., description="Username"),
     book_id: int = Query(..., description="Book ID"),
     new_status: str = Body(..., embed=True, description="New reading status"),
-    db: Session = Depends(get_db),
+    include_all: bool = Query(
+        False, description="Return the whole bookshelf instead of the updated entry."
+    ),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
     """
     Update bookshelf by user id.
     """
     dont_allow_empty_user(username)
+    if new_status not in Bookshelf.READING_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status: {new_status}")
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
+    user_id = await get_user_id(db, username)
+    if user_id is None:
         raise HTTPException(status_code=404, detail="User not found.")
 
-    bookshelf_entry = (
-        db.query(Bookshelf)
-        .filter(Bookshelf.user_id == user.id, Bookshelf.book_id == book_id)
-        .first()
+    bookshelf_entry = await db.scalar(
+        BOOKSHELF_ENTRY_WITH_BOOK, {"user_id": user_id, "book_id": book_id}
     )
     if not bookshelf_entry:
         raise HTTPException(
             status_code=404, detail="Book not found in user's bookshelf."
         )
 
-    if new_status not in Bookshelf.READING_STATUSES:
-        raise HTTPException(status_code=400, detail=f"Invalid status: {new_status}")
-
     bookshelf_entry.status = new_status
-    db.commit()
-    db.refresh(bookshelf_entry)
+    await db.commit()
+
+    if include_all:
+        result = await db.execute(BOOKSHELF_ROWS, {"user_id": user_id})
+        return {"username": username, "bookshelf": result.mappings().all()}
 
-    bookshelf_entries = (
-        db.query(models.Bookshelf).filter(models.Bookshelf.user_id == user.id).all()
-    )
     bookshelf = [
-        BookshelfEntry(
-            id=entry.id,
-            book_id=entry.book.id,
-            title=entry.book.title,
-            author=entry.book.author,
-            status=entry.status,
-            added_date=(entry.date_added.date() if entry.date_added else None),
-        )
-        for entry in bookshelf_entries
+        {
+            "id": bookshelf_entry.id,
+            "book_id": bookshelf_entry.book.id,
+            "title": bookshelf_entry.book.title,
+            "author": bookshelf_entry.book.author,
+            "status": bookshelf_entry.status,
+            "added_date": (
+                bookshelf_entry.date_added.date() if bookshelf_entry.date_added else None
+            ),
+        }
     ]
-    return BookshelfResponse(username=user.username, bookshelf=bookshelf)
\ No newline at end of file
+    return {"username": username, "bookshelf": bookshelf}
+
+
+@router.put("/{id}", response_model=UserResponse)
+async def update_user(
+    id: int,
+    user_update: UserCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Update user by id.
+    """
+    user = await db.get(models.User, id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+
+    username_changed = user_update.username != user.username
+    email_changed = user_update.email != user.email
+    if username_changed or email_changed:
+        result = await db.execute(
+            select(
+                exists().where(models.User.username == user_update.username)
+                if username_changed
+                else literal(False),
+                exists().where(models.User.email == user_update.email)
+                if email_changed
+                else literal(False),
+            )
+        )
+        username_taken, email_taken = result.one()
+        if username_taken:
+            raise HTTPException(status_code=400, detail="Username already exists.")
+        if email_taken:
+            raise HTTPException(status_code=400, detail="Email already exists.")
+
+    # RETURNING hands back the stored row, replacing the refresh SELECT.
+    user = await db.scalar(
+        update(models.User)
+        .where(models.User.id == id)
+        .values(
+            username=user_update.username,
+            email=user_update.email,
+            updated_at=datetime.now(timezone.utc),
+        )
+        .returning(models.User),
+        execution_options={"populate_existing": True},
+    )
+    await db.commit()
+    return user
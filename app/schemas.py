@@ -1,13 +1,16 @@
-from typing import Optional, List
+from typing import Annotated, Optional, List
 from datetime import date, datetime
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, StringConstraints, field_validator
+
+# Checked inside pydantic-core: at least one non-whitespace character.
+NonBlankStr = Annotated[str, StringConstraints(min_length=1, pattern=r"\S")]
 
 class BookCreate(BaseModel):
-    title: str = Field(..., min_length=1)
-    author: str = Field(..., min_length=1)
-    isbn: str = Field(..., min_length=1)
-    genre: str = Field(..., min_length=1)
-    description: str = Field(..., min_length=1)
+    title: NonBlankStr
+    author: NonBlankStr
+    isbn: NonBlankStr
+    genre: NonBlankStr
+    description: NonBlankStr
     published_date: Optional[date] = None
 
 class BookResponse(BaseModel):
@@ -22,23 +25,29 @@ class BookResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class UserCreate(BaseModel):
-    username: str = Field(..., min_length=5)
-    email: str = Field(..., min_length=1)
-    password: str = Field(..., min_length=6, max_length=20)
+class ExternalBook(BaseModel):
+    title: Optional[str] = None
+    author: Optional[str] = None
+    isbn: Optional[str] = None
+    genre: Optional[str] = None
+    published_date: Optional[int] = None
 
-    @field_validator("username")
-    @classmethod
-    def no_blank_spaces_username(cls, v):
-        if not v or v.strip() == "":
-            raise ValueError("Username cannot be empty or whitespace.")
-        return v
+class BookSearchResponse(BaseModel):
+    local: List[BookResponse]
+    external: List[ExternalBook]
+
+class BookPage(BaseModel):
+    items: List[BookResponse]
+    next_cursor: Optional[int] = None
+
+class UserCreate(BaseModel):
+    username: Annotated[str, StringConstraints(min_length=5, pattern=r"\S")]
+    email: NonBlankStr
+    password: Annotated[str, StringConstraints(min_length=6, max_length=20, pattern=r"\S")]
 
     @field_validator("email")
     @classmethod
-    def no_blank_spaces_and_at(cls, v):
-        if not v or v.strip() == "":
-            raise ValueError("Email cannot be empty or whitespace.")
+    def email_has_at(cls, v):
         if "@" not in v:
             raise ValueError("Email must contain '@'.")
         return v
@@ -54,6 +63,14 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[int] = None
+
+class BookshelfEntryCreate(BaseModel):
+    book_id: int
+    status: str = "to_read"
+
 class BookshelfEntry(BaseModel):
     id: int
     book_id: int
@@ -68,7 +85,7 @@ class BookshelfResponse(BaseModel):
 
 
 class ReadingListCreate(BaseModel):
-    name: str = Field(..., min_length=1)
+    name: NonBlankStr
 
 class ReadingListBookEntry(BaseModel):
     id: int
@@ -83,4 +100,17 @@ class ReadingListResponse(BaseModel):
     books: List[ReadingListBookEntry] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+
+class CacheInfo(BaseModel):
+    hits: int
+    misses: int
+    maxsize: Optional[int] = None
+    currsize: int
+
+class Message(BaseModel):
+    detail: str
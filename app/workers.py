@@ -0,0 +1,15 @@
+import os
+
+from uvicorn_worker import UvicornWorker
+
+
+class LimitedUvicornWorker(UvicornWorker):
+    """
+    Uvicorn worker for gunicorn that answers 503 once WORKER_CONNECTIONS
+    connections are open, instead of queueing requests it cannot serve in time.
+    """
+
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "limit_concurrency": int(os.getenv("WORKER_CONNECTIONS", "1000")),
+    }
@@ -0,0 +1,29 @@
+"""
+Gunicorn settings for production: gunicorn app.main:app -c gunicorn_conf.py
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Sets uvicorn's limit_concurrency from WORKER_CONNECTIONS; gunicorn's own
+# worker_connections setting is ignored by uvicorn workers.
+worker_class = "app.workers.LimitedUvicornWorker"
+
+# The app is async, so one worker per core keeps every core busy. Each worker
+# opens up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections; size this so the
+# total stays under the database's max_connections.
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+
+
+def on_starting(server):
+    """
+    Migrate once in the master so workers don't race on the alembic version table.
+    """
+    if os.getenv("RUN_MIGRATIONS", "1") == "1":
+        from app.migrations import upgrade_to_head
+
+        upgrade_to_head()
+    os.environ["RUN_MIGRATIONS"] = "0"
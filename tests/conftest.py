@@ -0,0 +1,41 @@
+import re
+import pytest
+from dataclasses import dataclass
+from typing import Optional
+from unittest.mock import Mock, create_autospec
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# bcrypt's minimum cost: hashes stay real bcrypt but take ~1 ms instead of ~250 ms.
+FAST_PWD_CONTEXT = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4)
+
+@dataclass(frozen=True, slots=True)
+class FakeUser:
+    id: int
+    username: str
+    email: Optional[str] = None
+
+def raises_http(status_code, detail=""):
+    # HTTPException renders as "<status>: <detail>", so one match checks both.
+    return pytest.raises(HTTPException, match=rf"^{status_code}: .*{re.escape(detail)}")
+
+@pytest.fixture(autouse=True)
+def fast_password_hashing(monkeypatch):
+    monkeypatch.setattr("app.auth.pwd_context", FAST_PWD_CONTEXT)
+
+@pytest.fixture(scope="session")
+def shared_db():
+    # Autospec keeps the stub honest: a misspelled or wrongly-awaited session
+    # method fails here instead of silently returning a child mock.
+    return create_autospec(AsyncSession, instance=True, spec_set=True)
+
+@pytest.fixture
+def mock_db(shared_db):
+    # One session mock, wiped after each test so configured results never leak.
+    yield shared_db
+    shared_db.reset_mock(return_value=True, side_effect=True)
+
+@pytest.fixture
+def mock_response():
+    return Mock(headers={})
@@ -21,62 +21,65 @@ def test_create_access_token():
 
     assert isinstance(token, str)
 
-def test_get_user(mocker):
-    mock_db = mocker.Mock()
+@pytest.mark.asyncio
+async def test_get_user(mocker):
+    mock_db = mocker.AsyncMock()
     mock_user = mocker.Mock()
     mock_user.username = "test123"
-    mock_db.query().filter().first.return_value = mock_user
+    mock_db.scalar.return_value = mock_user
 
-    user = get_user(mock_db, "test123")
+    user = await get_user(mock_db, "test123")
     assert user.username == "test123"
 
-    mock_db.query().filter().first.return_value = None
-    user_none = get_user(mock_db, "nouser")
+    mock_db.scalar.return_value = None
+    user_none = await get_user(mock_db, "nouser")
     assert user_none is None
 
-def test_authenticate_user(mocker):
-    mock_db = mocker.Mock()
+@pytest.mark.asyncio
+async def test_authenticate_user(mocker):
+    mock_db = mocker.AsyncMock()
     mock_user = mocker.Mock()
     mock_user.username = "test123"
     mock_user.hashed_password = get_password_hash("password123")
-    mock_db.query().filter().first.return_value = mock_user
+    mock_db.scalar.return_value = mock_user
 
     # Correct password
-    user = authenticate_user(mock_db, "test123", "password123")
+    user = await authenticate_user(mock_db, "test123", "password123")
     assert user == mock_user
 
     # Wrong password
-    user_invalid = authenticate_user(mock_db, "test123", "wrongpass")
+    user_invalid = await authenticate_user(mock_db, "test123", "wrongpass")
     assert user_invalid is False
 
     # User dont exist
-    mock_db.query().filter().first.return_value = None
-    user_none = authenticate_user(mock_db, "nouser", "password123")
+    mock_db.scalar.return_value = None
+    user_none = await authenticate_user(mock_db, "nouser", "password123")
     assert user_none is False
 
-def test_get_current_user(mocker):
-    mock_db = mocker.Mock()
+@pytest.mark.asyncio
+async def test_get_current_user(mocker):
+    mock_db = mocker.AsyncMock()
     mock_user = mocker.Mock()
     mock_user.username = "test123"
-    mock_db.query().filter().first.return_value = mock_user
+    mock_db.scalar.return_value = mock_user
 
     # Create token with 'sub' claim
     token = create_access_token({"sub": "test123"})
     # Patch Depends to pass token and db
-    user = get_current_user(token=token, db=mock_db)
+    user = await get_current_user(token=token, db=mock_db)
     assert user == mock_user
 
     # Invalid token
     with pytest.raises(Exception):
-        get_current_user(token="invalid.token", db=mock_db)
+        await get_current_user(token="invalid.token", db=mock_db)
 
     # Token with missing 'sub'
     bad_token = create_access_token({})
     with pytest.raises(Exception):
-        get_current_user(token=bad_token, db=mock_db)
+        await get_current_user(token=bad_token, db=mock_db)
 
     # User not found
-    mock_db.query().filter().first.return_value = None
+    mock_db.scalar.return_value = None
     token = create_access_token({"sub": "nouser"})
     with pytest.raises(Exception):
-        get_current_user(token=token, db=mock_db)
\ No newline at end of file
+        await get_current_user(token=token, db=mock_db)
\ No newline at end of file
@@ -0,0 +1,174 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from app.auth import get_current_user
+from app.database import async_engine, get_db
+from app.etag import make_etag
+from app.routers.book_router import (
+    BOOKS_BULK_LIMIT,
+    create_books_bulk,
+    get_all_books,
+    get_book_by_name_or_author,
+    router,
+)
+from app.schemas import BookCreate
+from tests.conftest import raises_http
+
+@pytest.fixture
+def mock_request():
+    return Mock(app=Mock(state=Mock(http=None, redis=None)), headers={})
+
+def book(title, isbn):
+    return BookCreate(
+        title=title, author="Author", isbn=isbn, genre="Fiction", description="About"
+    )
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        HTTPException(status_code=503, detail="Open Library API rate limit exceeded."),
+        HTTPException(status_code=502, detail="Open Library API error: 500 Internal Server Error"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_search_external_failure_passes_through(error, mock_db, mock_request):
+    settled = []
+
+    async def slow_execute(stmt):
+        await asyncio.sleep(0.01)
+        settled.append(stmt)
+        return Mock(all=Mock(return_value=[]))
+
+    mock_db.execute.side_effect = slow_execute
+    with patch("app.routers.book_router.lookup_openlibrary", AsyncMock(side_effect=error)):
+        with raises_http(error.status_code, error.detail):
+            await get_book_by_name_or_author(
+                request=mock_request,
+                title="Dune",
+                author=None,
+                limit=5,
+                external=True,
+                db=mock_db,
+            )
+    # The local query must be done before get_db gets to roll the session back.
+    assert len(settled) == 1
+
+@pytest.mark.asyncio
+async def test_search_external_merges_local_and_external(mock_db, mock_request):
+    mock_db.execute.return_value = Mock(all=Mock(return_value=[]))
+    docs = {"docs": [{"title": "Dune", "author_name": ["Frank Herbert"], "isbn": ["123"]}]}
+    with patch("app.routers.book_router.lookup_openlibrary", AsyncMock(return_value=docs)):
+        result = await get_book_by_name_or_author(
+            request=mock_request,
+            title="Dune",
+            author=None,
+            limit=5,
+            external=True,
+            db=mock_db,
+        )
+    assert result["local"] == []
+    assert result["external"] == [
+        {
+            "title": "Dune",
+            "author": "Frank Herbert",
+            "isbn": "123",
+            "genre": None,
+            "published_date": None,
+        }
+    ]
+    mock_db.execute.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_create_books_bulk_dedups_payload(mock_db):
+    mock_db.scalars.return_value = Mock(all=Mock(return_value=["A", "B"]))
+    books = [book("A", "1"), book("A", "2"), book("B", "1"), book("B", "3")]
+
+    result = await create_books_bulk(books=books, db=mock_db, current_user=Mock())
+
+    assert result == ["A", "B"]
+    batch = mock_db.scalars.await_args.args[1]
+    assert [(row["title"], row["isbn"]) for row in batch] == [("A", "1"), ("B", "3")]
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_create_books_bulk_inserts_in_batches(mock_db, monkeypatch):
+    monkeypatch.setattr("app.routers.book_router.BULK_INSERT_BATCH_SIZE", 2)
+    mock_db.scalars.side_effect = lambda stmt, batch: Mock(
+        all=Mock(return_value=[row["title"] for row in batch])
+    )
+    books = [book(f"T{i}", str(i)) for i in range(5)]
+
+    result = await create_books_bulk(books=books, db=mock_db, current_user=Mock())
+
+    assert result == ["T0", "T1", "T2", "T3", "T4"]
+    assert [len(call.args[1]) for call in mock_db.scalars.await_args_list] == [2, 2, 1]
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_create_books_bulk_skips_existing(mock_db):
+    # ON CONFLICT DO NOTHING returns only the rows that were actually inserted.
+    mock_db.scalars.return_value = Mock(all=Mock(return_value=["New"]))
+
+    result = await create_books_bulk(
+        books=[book("Taken", "1"), book("New", "2")], db=mock_db, current_user=Mock()
+    )
+
+    assert result == ["New"]
+    stmt, batch = mock_db.scalars.await_args.args
+    assert "ON CONFLICT DO NOTHING" in str(stmt.compile(dialect=async_engine.dialect))
+    assert len(batch) == 2
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_create_books_bulk_empty(mock_db):
+    assert await create_books_bulk(books=[], db=mock_db, current_user=Mock()) == []
+    mock_db.scalars.assert_not_awaited()
+
+def test_create_books_bulk_rejects_oversized_payload(mock_db):
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = lambda: mock_db
+    app.dependency_overrides[get_current_user] = lambda: Mock()
+    payload = [
+        book(f"T{i}", str(i)).model_dump() for i in range(BOOKS_BULK_LIMIT + 1)
+    ]
+
+    response = TestClient(app).post("/books/bulk", json=payload)
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "too_long"
+    mock_db.scalars.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_get_all_books_sets_etag(mock_db, mock_request, mock_response):
+    page = [Mock(id=1), Mock(id=2)]
+    mock_db.execute.side_effect = [
+        Mock(one=Mock(return_value=(2, 2, None))),
+        Mock(all=Mock(return_value=page)),
+    ]
+
+    result = await get_all_books(
+        request=mock_request, response=mock_response, after_id=None, limit=2, db=mock_db
+    )
+
+    assert result == {"items": page, "next_cursor": 2}
+    assert mock_response.headers["ETag"] == make_etag("books", None, 2, 2, 2, None)
+    assert mock_response.headers["Cache-Control"] == "private, max-age=30"
+
+@pytest.mark.asyncio
+async def test_get_all_books_not_modified(mock_db, mock_request, mock_response):
+    mock_db.execute.return_value = Mock(one=Mock(return_value=(2, 7, None)))
+    etag = make_etag("books", 5, 20, 2, 7, None)
+    mock_request.headers = {"if-none-match": etag}
+
+    result = await get_all_books(
+        request=mock_request, response=mock_response, after_id=5, limit=20, db=mock_db
+    )
+
+    assert result.status_code == 304
+    assert result.headers["etag"] == etag
+    assert result.headers["cache-control"] == "private, max-age=30"
+    # Only the version query runs; the page itself is never selected.
+    mock_db.execute.assert_awaited_once()
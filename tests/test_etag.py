@@ -0,0 +1,47 @@
+import pytest
+from unittest.mock import Mock
+from app.etag import make_etag, not_modified
+
+ETAG = make_etag("books", None, 20, 3, 42, None)
+
+def test_make_etag_is_quoted_and_stable():
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+    assert ETAG == make_etag("books", None, 20, 3, 42, None)
+
+def test_make_etag_changes_with_any_part():
+    assert make_etag("books", None, 20, 4, 42, None) != ETAG
+    assert make_etag("bookshelf", None, 20, 3, 42, None) != ETAG
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        ETAG,
+        f"W/{ETAG}",
+        f' "other", {ETAG} ',
+        f'W/"other",W/{ETAG}',
+        f'"a,b", {ETAG}',
+        "*",
+        " * ",
+    ],
+)
+def test_not_modified_matches(header):
+    response = Mock(headers={})
+    result = not_modified(Mock(headers={"if-none-match": header}), response, ETAG)
+    assert result.status_code == 304
+    assert result.headers["etag"] == ETAG
+    assert "ETag" not in response.headers
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {},
+        {"if-none-match": ""},
+        {"if-none-match": '"other"'},
+        {"if-none-match": 'W/"other", "another"'},
+        {"if-none-match": ETAG.strip('"')},
+    ],
+)
+def test_not_modified_misses(headers):
+    response = Mock(headers={})
+    assert not_modified(Mock(headers=headers), response, ETAG) is None
+    assert response.headers["ETag"] == ETAG
@@ -1,8 +1,12 @@
+import asyncio
+import json
+import httpx
 import pytest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 from fastapi import HTTPException
 from datetime import datetime, timezone
 from collections import namedtuple
+from pydantic import ValidationError
 
 
 from app.main import (
@@ -10,8 +14,28 @@ from app.main import (
     login,
     register_user,
     get_openlibrary_cache_info,
-    clear_openlibrary_cache
+    clear_openlibrary_cache,
+    database_error_handler,
+    integrity_error_handler,
 )
+from app.database import get_db
+from app.schemas import BookCreate, UserCreate
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+from app.openlibrary import (
+    SHARED_CACHE_TTL_SECONDS,
+    clear_failed_searches,
+    lookup_openlibrary,
+    search_openlibrary,
+    shared_cache_key,
+)
+
+@pytest.fixture(autouse=True)
+def clear_search_cache():
+    cached_search_openlibrary.cache_clear()
+    clear_failed_searches()
+    yield
+    cached_search_openlibrary.cache_clear()
+    clear_failed_searches()
 
 class DummyForm:
     def __init__(self, username, password):
@@ -19,15 +43,15 @@ class DummyForm:
         self.password = password
 
 @pytest.mark.asyncio
-@patch("app.main.search_openlibrary")
+@patch("app.openlibrary.search_openlibrary")
 async def test_cached_search_openlibrary_returns_result(mock_search):
     mock_search.return_value = [{"title": "Book"}]
     result = await cached_search_openlibrary("Book", "John", 2)
     assert result == [{"title": "Book"}]
-    mock_search.assert_awaited_once_with("Book", "John", 2)
+    mock_search.assert_awaited_once_with("Book", "John", 2, client=None)
 
 @pytest.mark.asyncio
-@patch("app.main.search_openlibrary")
+@patch("app.openlibrary.search_openlibrary")
 async def test_cached_search_openlibrary_caches_result(mock_search):
     mock_search.return_value = [{"title": "Book"}]
     result1 = await cached_search_openlibrary("Book", "John", 2)
@@ -36,7 +60,7 @@ async def test_cached_search_openlibrary_caches_result(mock_search):
     mock_search.assert_awaited_once()
 
 @pytest.mark.asyncio
-@patch("app.main.search_openlibrary")
+@patch("app.openlibrary.search_openlibrary")
 async def test_cached_search_openlibrary_different_args_not_cached(mock_search):
     mock_search.side_effect = [
         [{"title": "Book1"}],
@@ -47,15 +71,125 @@ async def test_cached_search_openlibrary_different_args_not_cached(mock_search):
     assert result1 != result2
     assert mock_search.await_count == 2
 
-def test_login_success(monkeypatch):
-    mock_db = Mock()
+@pytest.mark.asyncio
+@patch("app.openlibrary.search_openlibrary")
+async def test_lookup_openlibrary_normalizes_cache_key(mock_search):
+    mock_search.return_value = [{"title": "Book"}]
+    await lookup_openlibrary("The  Book", "John", 2)
+    await lookup_openlibrary(" the book ", "JOHN", 2)
+    mock_search.assert_awaited_once_with("the book", "john", 2, client=None)
+
+@pytest.mark.asyncio
+@patch("app.openlibrary.search_openlibrary")
+async def test_lookup_openlibrary_coalesces_concurrent_calls(mock_search):
+    async def slow_search(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return [{"title": "Book"}]
+    mock_search.side_effect = slow_search
+    results = await asyncio.gather(
+        *(lookup_openlibrary(title, "John", 2) for title in ["Book", "book", " BOOK "])
+    )
+    assert results == [[{"title": "Book"}]] * 3
+    mock_search.assert_awaited_once()
+
+@pytest.mark.asyncio
+@patch("app.openlibrary.search_openlibrary")
+async def test_lookup_openlibrary_uses_shared_cache(mock_search):
+    redis = AsyncMock()
+    redis.get.return_value = json.dumps({"docs": [{"title": "Shared"}]})
+    result = await lookup_openlibrary("Book", "John", 2, redis=redis)
+    assert result == {"docs": [{"title": "Shared"}]}
+    mock_search.assert_not_awaited()
+
+@pytest.mark.asyncio
+@patch("app.openlibrary.search_openlibrary")
+async def test_lookup_openlibrary_checks_local_cache_first(mock_search):
+    redis = AsyncMock()
+    redis.get.return_value = json.dumps({"docs": [{"title": "Shared"}]})
+    first = await lookup_openlibrary("Book", "John", 2, redis=redis)
+    second = await lookup_openlibrary("book", "JOHN", 2, redis=redis)
+    assert first == second == {"docs": [{"title": "Shared"}]}
+    redis.get.assert_awaited_once()
+    mock_search.assert_not_awaited()
+
+@pytest.mark.asyncio
+@patch("app.openlibrary.search_openlibrary")
+async def test_lookup_openlibrary_fills_shared_cache(mock_search):
+    mock_search.return_value = {"docs": []}
+    redis = AsyncMock()
+    redis.get.return_value = None
+    result = await lookup_openlibrary("Book", "John", 2, redis=redis)
+    assert result == {"docs": []}
+    redis.set.assert_awaited_once_with(
+        shared_cache_key("book", "john", 2), b'{"docs":[]}', ex=SHARED_CACHE_TTL_SECONDS
+    )
+
+@pytest.mark.asyncio
+@patch("app.openlibrary.search_openlibrary")
+async def test_lookup_openlibrary_survives_shared_cache_outage(mock_search):
+    mock_search.return_value = {"docs": []}
+    redis = AsyncMock()
+    redis.get.side_effect = ConnectionError("redis down")
+    redis.set.side_effect = ConnectionError("redis down")
+    assert await lookup_openlibrary("Book", "John", 2, redis=redis) == {"docs": []}
+    mock_search.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_lookup_openlibrary_falls_through_on_shared_cache_timeout():
+    client = Mock()
+    client.get = AsyncMock(return_value=httpx.Response(200, content=b'{"docs": [{"title": "Book"}]}'))
+    redis = AsyncMock()
+    redis.get.side_effect = TimeoutError("Timeout reading from socket")
+    result = await lookup_openlibrary("Book", "John", 2, client=client, redis=redis)
+    assert result == {"docs": [{"title": "Book"}]}
+    client.get.assert_awaited_once()
+    redis.set.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_search_openlibrary_parses_response():
+    client = Mock()
+    client.get = AsyncMock(return_value=httpx.Response(200, content=b'{"docs": [{"title": "Book"}]}'))
+    result = await search_openlibrary("Book", "John", 2, client=client)
+    assert result == {"docs": [{"title": "Book"}]}
+    client.get.assert_awaited_once_with(
+        "https://openlibrary.org/search.json", params={"limit": 2, "author": "John", "q": "Book"}
+    )
+
+@pytest.mark.asyncio
+async def test_search_openlibrary_remembers_failures():
+    client = Mock()
+    client.get = AsyncMock(side_effect=httpx.ConnectError("down"))
+    raised = []
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            await search_openlibrary("Book", "John", 2, client=client)
+        assert exc.value.status_code == 502
+        raised.append(exc.value)
+    client.get.assert_awaited_once()
+    # Each hit raises its own exception rather than re-raising a shared one.
+    assert raised[0] is not raised[1]
+    assert raised[0].detail == raised[1].detail
+
+@pytest.mark.asyncio
+async def test_search_openlibrary_retries_after_failure_expires(monkeypatch):
+    client = Mock()
+    client.get = AsyncMock(side_effect=httpx.ConnectError("down"))
+    monkeypatch.setattr("app.openlibrary.FAILURE_TTL_SECONDS", 0)
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await search_openlibrary("Book", "John", 2, client=client)
+    assert client.get.await_count == 2
+
+@pytest.mark.asyncio
+async def test_login_success(monkeypatch):
+    mock_db = AsyncMock()
     mock_user = Mock()
     mock_user.username = "user"
-    monkeypatch.setattr("app.main.authenticate_user", lambda db, u, p: mock_user)
+    monkeypatch.setattr("app.main.authenticate_user", AsyncMock(return_value=mock_user))
     monkeypatch.setattr("app.main.create_access_token", lambda data: "token123")
 
     form = DummyForm("user", "pass")
-    result = login(form, mock_db)
+    result = await login(form, mock_db)
     assert result == {"access_token": "token123", "token_type": "bearer"}
 
 @pytest.mark.parametrize(
@@ -67,20 +201,22 @@ def test_login_success(monkeypatch):
         ("user", "   ", "Password cannot be empty or whitespace."),
     ],
 )
-def test_login_empty_fields(username, password, detail):
-    mock_db = Mock()
+@pytest.mark.asyncio
+async def test_login_empty_fields(username, password, detail):
+    mock_db = AsyncMock()
     form = DummyForm(username, password)
     with pytest.raises(HTTPException) as exc:
-        login(form, mock_db)
+        await login(form, mock_db)
     assert exc.value.status_code == 400
     assert exc.value.detail == detail
 
-def test_login_invalid_user(monkeypatch):
-    mock_db = Mock()
-    monkeypatch.setattr("app.main.authenticate_user", lambda db, u, p: None)
+@pytest.mark.asyncio
+async def test_login_invalid_user(monkeypatch):
+    mock_db = AsyncMock()
+    monkeypatch.setattr("app.main.authenticate_user", AsyncMock(return_value=None))
     form = DummyForm("user", "wrongpass")
     with pytest.raises(HTTPException) as exc:
-        login(form, mock_db)
+        await login(form, mock_db)
     assert exc.value.status_code == 400
     assert exc.value.detail == "Incorrect username or password"
 
@@ -91,60 +227,73 @@ def make_user_create(username="user", email="user@example.com", password="pass")
     mock_user.password = password
     return mock_user
 
-def test_register_user_success(monkeypatch):
-    mock_db = Mock()
-    mock_db.query().filter().first.side_effect = [None, None]
+@pytest.mark.asyncio
+async def test_register_user_success(monkeypatch):
+    mock_db = AsyncMock()
     monkeypatch.setattr("app.main.get_password_hash", lambda pw: "hashed")
     now = datetime.now(timezone.utc)
-    mock_user_obj = Mock()
     monkeypatch.setattr("app.main.datetime", Mock(now=Mock(return_value=now)))
-    mock_db.add = Mock()
-    mock_db.commit = Mock()
-    mock_db.refresh = Mock()
+    db_user = Mock(username="user", email="user@example.com")
+    mock_db.scalar.return_value = db_user
     user = make_user_create()
 
-    with patch("app.main.models.User", return_value=mock_user_obj) as user_ctor:
-        result = register_user(user, mock_db)
-        assert result == mock_user_obj
-        mock_db.add.assert_called_once_with(mock_user_obj)
-        mock_db.commit.assert_called_once()
-        mock_db.refresh.assert_called_once_with(mock_user_obj)
-        user_ctor.assert_called_once()
+    result = await register_user(user, mock_db)
+    assert result is db_user
+    insert = mock_db.scalar.await_args.args[0].compile().params
+    assert insert["username"] == "user"
+    assert insert["email"] == "user@example.com"
+    assert insert["hashed_password"] == "hashed"
+    assert insert["created_at"] == now
+    mock_db.execute.assert_not_awaited()
+    mock_db.commit.assert_awaited_once()
 
 @pytest.mark.parametrize(
-    "username,email,password,detail",
+    "username,email,password,field",
     [
-        ("", "user@example.com", "pass", "Username cannot be empty."),
-        ("   ", "user@example.com", "pass", "Username cannot be empty."),
-        ("user", "", "pass", "Email cannot be empty."),
-        ("user", "   ", "pass", "Email cannot be empty."),
-        ("user", "user@example.com", "", "Password cannot be empty."),
-        ("user", "user@example.com", "   ", "Password cannot be empty."),
+        ("", "user@example.com", "secret1", "username"),
+        ("      ", "user@example.com", "secret1", "username"),
+        ("someuser", "", "secret1", "email"),
+        ("someuser", "   ", "secret1", "email"),
+        ("someuser", "user@example.com", "", "password"),
+        ("someuser", "user@example.com", "       ", "password"),
     ],
 )
-def test_register_user_empty_fields(username, email, password, detail):
-    mock_db = Mock()
-    user = make_user_create(username=username, email=email, password=password)
-    with pytest.raises(HTTPException) as exc:
-        register_user(user, mock_db)
-    assert exc.value.status_code == 400
-    assert exc.value.detail == detail
+def test_user_create_rejects_empty_fields(username, email, password, field):
+    with pytest.raises(ValidationError) as exc:
+        UserCreate(username=username, email=email, password=password)
+    assert [e["loc"] for e in exc.value.errors()] == [(field,)]
+
+@pytest.mark.parametrize("field", ["title", "author", "isbn", "genre", "description"])
+def test_book_create_rejects_blank_fields(field):
+    values = dict(title="Dune", author="Frank Herbert", isbn="9780441013593", genre="SF", description="Spice")
+    values[field] = "   "
+    with pytest.raises(ValidationError) as exc:
+        BookCreate(**values)
+    assert [e["loc"] for e in exc.value.errors()] == [(field,)]
 
-def test_register_user_username_exists(monkeypatch):
-    mock_db = Mock()
-    mock_db.query().filter().first.side_effect = [Mock(), None]
+@pytest.mark.asyncio
+async def test_register_user_username_exists(monkeypatch):
+    mock_db = AsyncMock()
+    mock_db.scalar.return_value = None
+    mock_db.execute.return_value = Mock(
+        all=Mock(return_value=[Mock(username="user", email="other@example.com")])
+    )
     user = make_user_create()
     with pytest.raises(HTTPException) as exc:
-        register_user(user, mock_db)
+        await register_user(user, mock_db)
     assert exc.value.status_code == 400
     assert exc.value.detail == "Username already exists."
 
-def test_register_user_email_exists(monkeypatch):
-    mock_db = Mock()
-    mock_db.query().filter().first.side_effect = [None, Mock()]
+@pytest.mark.asyncio
+async def test_register_user_email_exists(monkeypatch):
+    mock_db = AsyncMock()
+    mock_db.scalar.return_value = None
+    mock_db.execute.return_value = Mock(
+        all=Mock(return_value=[Mock(username="other", email="user@example.com")])
+    )
     user = make_user_create()
     with pytest.raises(HTTPException) as exc:
-        register_user(user, mock_db)
+        await register_user(user, mock_db)
     assert exc.value.status_code == 400
     assert exc.value.detail == "Email already exists."
 
@@ -161,9 +310,51 @@ async def test_get_openlibrary_cache_info(monkeypatch):
 @pytest.mark.asyncio
 async def test_clear_openlibrary_cache(monkeypatch):
     called = {}
-    async def fake_clear():
+    def fake_clear():
         called["ok"] = True
     monkeypatch.setattr("app.main.cached_search_openlibrary.cache_clear", fake_clear)
     result = await clear_openlibrary_cache()
     assert result == {"detail": "Cache cleared."}
-    assert called["ok"]
\ No newline at end of file
+    assert called["ok"]
+
+@pytest.mark.asyncio
+async def test_get_db_rolls_back_on_error(monkeypatch):
+    session = AsyncMock()
+    session_cm = AsyncMock()
+    session_cm.__aenter__.return_value = session
+    monkeypatch.setattr("app.database.AsyncSessionLocal", Mock(return_value=session_cm))
+    dependency = get_db()
+    assert await dependency.__anext__() is session
+    with pytest.raises(SQLAlchemyError):
+        await dependency.athrow(SQLAlchemyError("boom"))
+    session.rollback.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_database_error_handler_hides_statement(caplog):
+    request = Mock(method="POST", url=Mock(path="/register"))
+    exc = OperationalError(
+        "INSERT INTO users (username, hashed_password) VALUES (?, ?)",
+        ("anna", "$2b$12$secrethash"),
+        Exception("canceling statement due to statement timeout"),
+    )
+    response = await database_error_handler(request, exc)
+    assert response.status_code == 500
+    assert json.loads(response.body) == {"detail": "Internal database error."}
+    for leaked in (b"INSERT", b"users", b"secrethash", b"timeout"):
+        assert leaked not in response.body
+    # The full error, SQL included, still reaches the server log.
+    assert "secrethash" in caplog.text
+
+@pytest.mark.asyncio
+async def test_integrity_error_handler_hides_driver_message():
+    request = Mock(method="POST", url=Mock(path="/books"))
+    exc = IntegrityError(
+        "INSERT INTO books (isbn) VALUES (?)",
+        ("978-0",),
+        Exception("UNIQUE constraint failed: books.isbn"),
+    )
+    response = await integrity_error_handler(request, exc)
+    assert response.status_code == 400
+    assert json.loads(response.body) == {"detail": "Database integrity error."}
+    for leaked in (b"INSERT", b"books.isbn", b"978-0", b"UNIQUE"):
+        assert leaked not in response.body
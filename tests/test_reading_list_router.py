@@ -1,134 +1,174 @@
 import pytest
-from unittest.mock import MagicMock, Mock, patch
-from fastapi import HTTPException
+from dataclasses import dataclass
+from unittest.mock import Mock
+from sqlalchemy.exc import SQLAlchemyError
+from app.etag import make_etag
 from app.routers.reading_list_router import (
     dont_allow_empty_user,
     create_reading_list,
     get_reading_lists,
     delete_reading_list
 )
+from tests.conftest import FakeUser, raises_http
 
-@pytest.fixture
-def mock_db():
-    return Mock()
+@dataclass(frozen=True, slots=True)
+class FakeBook:
+    id: int
+    title: str
+    author: str
 
-@pytest.fixture
+@dataclass(frozen=True, slots=True)
+class FakeReadingList:
+    id: int
+    list_name: str
+    books: tuple = ()
+
+# Frozen, so tests can share them without one leaking changes into another.
+BOOK = FakeBook(1, "Test Book", "Test Author")
+EMPTY_LIST = FakeReadingList(42, "My List")
+LIST_WITH_BOOK = FakeReadingList(42, "My List", (BOOK,))
+
+@pytest.fixture(scope="session")
 def mock_user():
-    user = Mock()
-    user.id = 1
-    user.username = "anna"
-    return user
+    return FakeUser(1, "anna")
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_current_user():
-    return Mock()
+    return FakeUser(1, "anna")
+
+@pytest.fixture
+def mock_request():
+    return Mock(headers={})
+
+def list_rows(user_id, names):
+    return Mock(all=Mock(return_value=[Mock(id=user_id, list_name=n) for n in names]))
 
-class DummyForm:
-    def __init__(self, username):
-        self.username = username
+def stub_reading_lists(db, user_id, version, lists=()):
+    # Wires the user id lookup, the ETag version row and the list query in one go.
+    db.scalar.return_value = user_id
+    db.execute.return_value = Mock(one=Mock(return_value=version))
+    db.scalars.return_value = Mock(all=Mock(return_value=list(lists)))
 
 def test_dont_allow_empty_user_valid():
     assert dont_allow_empty_user("anna") is None
 
-def test_dont_allow_empty_user_empty():
-    with pytest.raises(HTTPException):
-        dont_allow_empty_user("")
+@pytest.mark.parametrize("username", ["", "   ", "\t", "\n"])
+def test_dont_allow_empty_user_invalid(username):
+    with raises_http(400):
+        dont_allow_empty_user(username)
 
-def test_dont_allow_empty_user_whitespace():
-    with pytest.raises(HTTPException):
-        dont_allow_empty_user("   ")
-
-def test_create_reading_list_user_not_found(mock_db, mock_current_user):
-    mock_db.query().filter().first.return_value = None
-    with pytest.raises(HTTPException) as exc:
-        create_reading_list(
+@pytest.mark.asyncio
+async def test_create_reading_list_user_not_found(mock_db, mock_current_user):
+    mock_db.execute.return_value = list_rows(None, [])
+    with raises_http(404, "User not found"):
+        await create_reading_list(
             username="ghost",
             name="My List",
             db=mock_db,
             current_user=mock_current_user
         )
-    assert exc.value.status_code == 404
-    assert "User not found" in exc.value.detail
-
-def test_create_reading_list_max_limit(mock_db, mock_user, mock_current_user):
-    mock_db.query().filter().first.return_value = mock_user
-    mock_db.query().filter().count.return_value = 3
-    with pytest.raises(HTTPException) as exc:
-        create_reading_list(
+
+@pytest.mark.asyncio
+async def test_create_reading_list_max_limit(mock_db, mock_user, mock_current_user):
+    mock_db.execute.return_value = list_rows(mock_user.id, ["A", "B", "C"])
+    with raises_http(400, "3 reading lists"):
+        await create_reading_list(
             username="anna",
             name="New List",
             db=mock_db,
             current_user=mock_current_user
         )
-    assert exc.value.status_code == 400
-    assert "3 reading lists" in exc.value.detail
-
-def test_create_reading_list_duplicate_name(mock_db, mock_user, mock_current_user):
-    mock_db.query().filter().first.return_value = mock_user
-    mock_db.query().filter().count.return_value = 1
-    mock_db.query().filter().filter().first.return_value = Mock()
-    with pytest.raises(HTTPException) as exc:
-        create_reading_list(
+
+@pytest.mark.asyncio
+async def test_create_reading_list_duplicate_name(mock_db, mock_user, mock_current_user):
+    mock_db.execute.return_value = list_rows(mock_user.id, ["Existing List"])
+    with raises_http(400, "already exists"):
+        await create_reading_list(
             username="anna",
             name="Existing List",
             db=mock_db,
             current_user=mock_current_user
         )
-    assert exc.value.status_code == 400
-    assert "already exists" in exc.value.detail
 
-@patch("app.routers.reading_list_router.models.ReadingList")
-def test_create_reading_list_success(mock_reading_list_model, mock_db, mock_user, mock_current_user):
-    mock_db.query.return_value.filter.return_value.first.return_value = mock_user
-    mock_db.query.return_value.filter.return_value.count.return_value = 1
-    
-    duplicate_check_mock = Mock()
-    duplicate_check_mock.filter.return_value.first.return_value = None
-    
-    mock_db.query.side_effect = [
-        mock_db.query.return_value,
-        mock_db.query.return_value,
-        duplicate_check_mock
-    ]
-    
-    reading_list_obj = Mock(id=42, list_name="My List", user_id=1)
-    mock_reading_list_model.return_value = reading_list_obj
-    
-    result = create_reading_list(
+@pytest.mark.asyncio
+async def test_create_reading_list_success(mock_db, mock_user, mock_current_user):
+    mock_db.execute.return_value = list_rows(mock_user.id, ["Other List"])
+    mock_db.scalar.return_value = FakeReadingList(42, "My List")
+
+    result = await create_reading_list(
         username="anna",
         name="My List",
         db=mock_db,
         current_user=mock_current_user
     )
-    
-    assert result.id == 42
 
-def test_get_reading_lists_user_not_found(mock_db, mock_current_user):
-    mock_db.query().filter().first.return_value = None
-    with pytest.raises(HTTPException) as exc:
-        get_reading_lists(
+    assert result["id"] == 42
+    assert result["reading_list_name"] == "My List"
+    insert = mock_db.scalar.await_args.args[0].compile().params
+    assert insert["user_id"] == mock_user.id
+    assert insert["list_name"] == "My List"
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_create_reading_list_first_list(mock_db, mock_user, mock_current_user):
+    mock_db.execute.return_value = list_rows(mock_user.id, [None])
+    mock_db.scalar.return_value = FakeReadingList(7, "First")
+
+    result = await create_reading_list(
+        username="anna",
+        name="First",
+        db=mock_db,
+        current_user=mock_current_user
+    )
+
+    assert result["id"] == 7
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_create_reading_list_concurrent_duplicate(mock_db, mock_user, mock_current_user):
+    mock_db.execute.return_value = list_rows(mock_user.id, [None])
+    mock_db.scalar.return_value = None
+    with raises_http(400, "already exists"):
+        await create_reading_list(
+            username="anna",
+            name="My List",
+            db=mock_db,
+            current_user=mock_current_user
+        )
+    mock_db.commit.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_get_reading_lists_user_not_found(mock_db, mock_current_user, mock_request, mock_response):
+    mock_db.scalar.return_value = None
+    with raises_http(404, "User not found"):
+        await get_reading_lists(
+            request=mock_request,
+            response=mock_response,
             username="user",
             db=mock_db,
             current_user=mock_current_user
         )
-    assert exc.value.status_code == 404
-    assert "User not found" in exc.value.detail
 
-def test_get_reading_lists_empty_username(mock_db, mock_current_user):
-    with pytest.raises(HTTPException) as exc:
-        get_reading_lists(
-            username="",
+@pytest.mark.parametrize("username", ["", "   "])
+@pytest.mark.asyncio
+async def test_get_reading_lists_empty_username(username, mock_db, mock_current_user, mock_request, mock_response):
+    with raises_http(400, "non-empty username"):
+        await get_reading_lists(
+            request=mock_request,
+            response=mock_response,
+            username=username,
             db=mock_db,
             current_user=mock_current_user
         )
-    assert exc.value.status_code == 400
-    assert "non-empty username" in exc.value.detail
+    mock_db.scalar.assert_not_awaited()
 
-def test_get_reading_lists_success_no_lists(mock_db, mock_user, mock_current_user):
-    mock_db.query().filter().first.return_value = mock_user
-    mock_db.query().filter().all.return_value = []
+@pytest.mark.asyncio
+async def test_get_reading_lists_success_no_lists(mock_db, mock_user, mock_current_user, mock_request, mock_response):
+    stub_reading_lists(mock_db, mock_user.id, (0, None, None, 0, None))
     
-    result = get_reading_lists(
+    result = await get_reading_lists(
+        request=mock_request,
+        response=mock_response,
         username="anna",
         db=mock_db,
         current_user=mock_current_user
@@ -136,180 +176,133 @@ def test_get_reading_lists_success_no_lists(mock_db, mock_user, mock_current_use
     
     assert result == []
 
-def test_get_reading_lists_success_with_lists(mock_db, mock_user, mock_current_user):
-    mock_db.query().filter().first.return_value = mock_user
-    
-    mock_book = Mock()
-    mock_book.id = 1
-    mock_book.title = "Test Book"
-    mock_book.author = "Test Author"
+@pytest.mark.asyncio
+async def test_get_reading_lists_success_with_lists(mock_db, mock_user, mock_current_user, mock_request, mock_response):
+    stub_reading_lists(mock_db, mock_user.id, (1, 42, None, 1, None), [LIST_WITH_BOOK])
     
-    mock_reading_list = Mock()
-    mock_reading_list.id = 42
-    mock_reading_list.list_name = "My List"
-    mock_reading_list.books = [mock_book]
-    
-    mock_db.query().filter().all.return_value = [mock_reading_list]
-    
-    result = get_reading_lists(
+    result = await get_reading_lists(
+        request=mock_request,
+        response=mock_response,
         username="anna",
         db=mock_db,
         current_user=mock_current_user
     )
     
     assert len(result) == 1
-    assert result[0].id == 42
-    assert result[0].username == "anna"
-    assert result[0].reading_list_name == "My List"
-    assert len(result[0].books) == 1
-    assert result[0].books[0].title == "Test Book"
-
-def test_delete_reading_list_empty_username(mock_db, mock_current_user):
-    with pytest.raises(HTTPException) as exc:
-        delete_reading_list(
-            username="",
-            name="My List",
-            db=mock_db,
-            current_user=mock_current_user
-        )
-    assert exc.value.status_code == 400
-    assert "non-empty username" in exc.value.detail
+    assert result[0]["id"] == 42
+    assert result[0]["username"] == "anna"
+    assert result[0]["reading_list_name"] == "My List"
+    assert len(result[0]["books"]) == 1
+    assert result[0]["books"][0]["title"] == "Test Book"
+    assert mock_response.headers["ETag"] == make_etag("readinglists", "anna", 1, 1, 42, None, 1, None)
 
-def test_delete_reading_list_empty_name(mock_db, mock_current_user):
-    with pytest.raises(HTTPException) as exc:
-        delete_reading_list(
-            username="anna",
-            name="",
+@pytest.mark.asyncio
+async def test_get_reading_lists_not_modified(mock_db, mock_user, mock_current_user, mock_request, mock_response):
+    stub_reading_lists(mock_db, mock_user.id, (1, 42, None, 1, None))
+    etag = make_etag("readinglists", "anna", 1, 1, 42, None, 1, None)
+    mock_request.headers = {"if-none-match": etag}
+
+    result = await get_reading_lists(
+        request=mock_request,
+        response=mock_response,
+        username="anna",
+        db=mock_db,
+        current_user=mock_current_user
+    )
+
+    assert result.status_code == 304
+    assert result.headers["etag"] == etag
+    mock_db.scalars.assert_not_awaited()
+
+@pytest.mark.parametrize(
+    "username,name,detail",
+    [
+        ("", "My List", "non-empty username"),
+        ("   ", "My List", "non-empty username"),
+        ("anna", "", "non-empty reading list name"),
+        ("anna", "   ", "non-empty reading list name"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_delete_reading_list_empty_input(username, name, detail, mock_db, mock_current_user):
+    with raises_http(400, detail):
+        await delete_reading_list(
+            username=username,
+            name=name,
             db=mock_db,
             current_user=mock_current_user
         )
-    assert exc.value.status_code == 400
-    assert "non-empty reading list name" in exc.value.detail
+    mock_db.scalar.assert_not_awaited()
 
-def test_delete_reading_list_user_not_found(mock_db, mock_current_user):
-    mock_db.query().filter().first.return_value = None
-    with pytest.raises(HTTPException) as exc:
-        delete_reading_list(
+@pytest.mark.asyncio
+async def test_delete_reading_list_user_not_found(mock_db, mock_current_user):
+    mock_db.scalar.return_value = None
+    with raises_http(404, "User not found"):
+        await delete_reading_list(
             username="ghost",
             name="My List",
             db=mock_db,
             current_user=mock_current_user
         )
-    assert exc.value.status_code == 404
-    assert "User not found" in exc.value.detail
 
-def test_delete_reading_list_not_found(mock_db, mock_user, mock_current_user):
-    user_query_mock = Mock()
-    user_query_mock.filter.return_value.first.return_value = mock_user
-    
-    reading_list_query_mock = Mock()
-    reading_list_query_mock.filter.return_value.first.return_value = None
+@pytest.mark.asyncio
+async def test_delete_reading_list_not_found(mock_db, mock_user, mock_current_user):
+    mock_db.scalar.side_effect = [mock_user.id, None]
     
-    mock_db.query.side_effect = [user_query_mock, reading_list_query_mock]
-    
-    with pytest.raises(HTTPException) as exc:
-        delete_reading_list(
+    with raises_http(404, "Reading list not found"):
+        await delete_reading_list(
             username="anna",
             name="Non-existent List",
             db=mock_db,
             current_user=mock_current_user
         )
-    assert exc.value.status_code == 404
-    assert "Reading list not found" in exc.value.detail
 
-def test_delete_reading_list_success_no_books(mock_db, mock_user, mock_current_user):
-    user_query_mock = Mock()
-    user_query_mock.filter.return_value.first.return_value = mock_user
-    
-    mock_reading_list = Mock()
-    mock_reading_list.id = 42
-    mock_reading_list.list_name = "My List"
-    mock_reading_list.books = []
-    
-    reading_list_query_mock = Mock()
-    reading_list_query_mock.filter.return_value.first.return_value = mock_reading_list
-    
-    mock_db.query.side_effect = [user_query_mock, reading_list_query_mock]
+@pytest.mark.asyncio
+async def test_delete_reading_list_success_no_books(mock_db, mock_user, mock_current_user):
+    mock_db.scalar.side_effect = [mock_user.id, EMPTY_LIST]
     
-    mock_db.delete = Mock()
-    mock_db.commit = Mock()
-    
-    result = delete_reading_list(
+    result = await delete_reading_list(
         username="anna",
         name="My List",
         db=mock_db,
         current_user=mock_current_user
     )
     
-    assert result.id == 42
-    assert result.username == "anna"
-    assert result.reading_list_name == "My List"
-    assert result.books == []
-    mock_db.delete.assert_called_once_with(mock_reading_list)
-    mock_db.commit.assert_called_once()
-
-def test_delete_reading_list_success_with_books(mock_db, mock_user, mock_current_user):
-    user_query_mock = Mock()
-    user_query_mock.filter.return_value.first.return_value = mock_user
-    
-    mock_book = Mock()
-    mock_book.id = 1
-    mock_book.title = "Test Book"
-    mock_book.author = "Test Author"
-    
-    mock_reading_list = Mock()
-    mock_reading_list.id = 42
-    mock_reading_list.list_name = "My List"
-    mock_reading_list.books = [mock_book]
-    
-    reading_list_query_mock = Mock()
-    reading_list_query_mock.filter.return_value.first.return_value = mock_reading_list
-    
-    mock_db.query.side_effect = [user_query_mock, reading_list_query_mock]
-    
-    mock_db.delete = Mock()
-    mock_db.commit = Mock()
+    assert result["id"] == 42
+    assert result["username"] == "anna"
+    assert result["reading_list_name"] == "My List"
+    assert result["books"] == []
+    mock_db.delete.assert_awaited_once_with(EMPTY_LIST)
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_delete_reading_list_success_with_books(mock_db, mock_user, mock_current_user):
+    mock_db.scalar.side_effect = [mock_user.id, LIST_WITH_BOOK]
     
-    result = delete_reading_list(
+    result = await delete_reading_list(
         username="anna",
         name="My List",
         db=mock_db,
         current_user=mock_current_user
     )
     
-    assert result.id == 42
-    assert result.username == "anna"
-    assert result.reading_list_name == "My List"
-    assert len(result.books) == 1
-    assert result.books[0].title == "Test Book"
-    mock_db.delete.assert_called_once_with(mock_reading_list)
-    mock_db.commit.assert_called_once()
-
-def test_delete_reading_list_database_error(mock_db, mock_user, mock_current_user):
-    user_query_mock = Mock()
-    user_query_mock.filter.return_value.first.return_value = mock_user
-    
-    mock_reading_list = Mock()
-    mock_reading_list.id = 42
-    mock_reading_list.list_name = "My List"
-    mock_reading_list.books = []
-    
-    reading_list_query_mock = Mock()
-    reading_list_query_mock.filter.return_value.first.return_value = mock_reading_list
-    
-    mock_db.query.side_effect = [user_query_mock, reading_list_query_mock]
-    
-    mock_db.delete = Mock()
-    mock_db.commit = Mock(side_effect=Exception("Database error"))
-    mock_db.rollback = Mock()
+    assert result["id"] == 42
+    assert result["username"] == "anna"
+    assert result["reading_list_name"] == "My List"
+    assert len(result["books"]) == 1
+    assert result["books"][0]["title"] == "Test Book"
+    mock_db.delete.assert_awaited_once_with(LIST_WITH_BOOK)
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_delete_reading_list_database_error(mock_db, mock_user, mock_current_user):
+    mock_db.scalar.side_effect = [mock_user.id, EMPTY_LIST]
+    mock_db.commit.side_effect = SQLAlchemyError("Database error")
     
-    with pytest.raises(HTTPException) as exc:
-        delete_reading_list(
+    with pytest.raises(SQLAlchemyError):
+        await delete_reading_list(
             username="anna",
             name="My List",
             db=mock_db,
             current_user=mock_current_user
         )
-    assert exc.value.status_code == 500
-    assert "Database error" in exc.value.detail
-    mock_db.rollback.assert_called_once()
\ No newline at end of file
@@ -0,0 +1,378 @@
+import pytest
+import pytest_asyncio
+from dataclasses import dataclass
+from datetime import date, datetime
+from unittest.mock import Mock
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app import models
+from app.database import Base, async_engine
+from app.etag import make_etag
+from app.routers.user_router import (
+    add_book_to_bookshelf,
+    add_books_to_bookshelf,
+    get_user_bookshelf,
+    update_user,
+)
+from app.schemas import BookshelfEntryCreate, UserCreate
+from tests.conftest import FakeUser, raises_http
+
+@dataclass(frozen=True, slots=True)
+class FakeBookRow:
+    id: int
+    title: str
+    author: str
+
+@dataclass(frozen=True, slots=True)
+class FakeShelfEntry:
+    id: int
+    book_id: int
+    status: str
+    date_added: date
+
+BOOK_ROWS = [FakeBookRow(1, "Dune", "Herbert"), FakeBookRow(2, "Emma", "Austen")]
+TODAY = date(2024, 5, 1)
+ANNA = FakeUser(1, "annabel", "anna@example.com")
+
+def entries(*pairs):
+    return [BookshelfEntryCreate(book_id=book_id, status=status) for book_id, status in pairs]
+
+def inserted(*rows):
+    return Mock(all=Mock(return_value=[FakeShelfEntry(*row, TODAY) for row in rows]))
+
+@pytest.mark.asyncio
+async def test_add_book_to_bookshelf_success(mock_db):
+    mock_db.scalar.return_value = FakeShelfEntry(10, 1, "reading", TODAY)
+    mock_db.get.return_value = BOOK_ROWS[0]
+
+    result = await add_book_to_bookshelf(
+        username="anna", book_id=1, status="reading", db=mock_db, current_user=Mock()
+    )
+
+    assert result == {
+        "username": "anna",
+        "bookshelf": [
+            {
+                "id": 10,
+                "book_id": 1,
+                "title": "Dune",
+                "author": "Herbert",
+                "status": "reading",
+                "added_date": TODAY,
+            }
+        ],
+    }
+    sql = str(mock_db.scalar.await_args.args[0].compile(dialect=async_engine.dialect))
+    assert "ON CONFLICT DO NOTHING" in sql and "RETURNING" in sql
+    # A successful insert needs no follow-up query to explain itself.
+    mock_db.execute.assert_not_awaited()
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.parametrize(
+    "found,status_code,detail",
+    [
+        ((None, None), 404, "User not found."),
+        ((None, 1), 404, "User not found."),
+        ((7, None), 404, "Book not found."),
+        ((7, 1), 400, "Book already in user's bookshelf."),
+    ],
+)
+@pytest.mark.asyncio
+async def test_add_book_to_bookshelf_not_inserted(found, status_code, detail, mock_db):
+    mock_db.scalar.return_value = None
+    mock_db.execute.return_value = Mock(one=Mock(return_value=found))
+    with raises_http(status_code, detail):
+        await add_book_to_bookshelf(
+            username="anna", book_id=1, status="read", db=mock_db, current_user=Mock()
+        )
+    mock_db.execute.assert_awaited_once()
+    mock_db.commit.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_add_books_to_bookshelf_success(mock_db):
+    mock_db.scalar.return_value = 7
+    mock_db.execute.return_value = BOOK_ROWS
+    mock_db.scalars.return_value = inserted((10, 1, "to_read"), (11, 2, "reading"))
+
+    result = await add_books_to_bookshelf(
+        username="anna",
+        entries=entries((1, "to_read"), (2, "reading")),
+        db=mock_db,
+        current_user=Mock(),
+    )
+
+    assert result["username"] == "anna"
+    assert result["bookshelf"] == [
+        {
+            "id": 10,
+            "book_id": 1,
+            "title": "Dune",
+            "author": "Herbert",
+            "status": "to_read",
+            "added_date": TODAY,
+        },
+        {
+            "id": 11,
+            "book_id": 2,
+            "title": "Emma",
+            "author": "Austen",
+            "status": "reading",
+            "added_date": TODAY,
+        },
+    ]
+    stmt, rows = mock_db.scalars.await_args.args
+    assert "ON CONFLICT DO NOTHING" in str(stmt.compile(dialect=async_engine.dialect))
+    assert [(row["user_id"], row["book_id"], row["status"]) for row in rows] == [
+        (7, 1, "to_read"),
+        (7, 2, "reading"),
+    ]
+    mock_db.execute.assert_awaited_once()
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_add_books_to_bookshelf_dedups_payload(mock_db):
+    mock_db.scalar.return_value = 7
+    mock_db.execute.return_value = BOOK_ROWS
+    mock_db.scalars.return_value = inserted((10, 1, "read"))
+
+    await add_books_to_bookshelf(
+        username="anna",
+        entries=entries((1, "read"), (1, "to_read"), (1, "reading")),
+        db=mock_db,
+        current_user=Mock(),
+    )
+
+    # The first status given for a book wins.
+    rows = mock_db.scalars.await_args.args[1]
+    assert [(row["book_id"], row["status"]) for row in rows] == [(1, "read")]
+
+@pytest.mark.asyncio
+async def test_add_books_to_bookshelf_skips_books_already_shelved(mock_db):
+    mock_db.scalar.return_value = 7
+    mock_db.execute.return_value = BOOK_ROWS
+    # ON CONFLICT DO NOTHING returns only the rows that were actually inserted.
+    mock_db.scalars.return_value = inserted((11, 2, "reading"))
+
+    result = await add_books_to_bookshelf(
+        username="anna",
+        entries=entries((1, "to_read"), (2, "reading")),
+        db=mock_db,
+        current_user=Mock(),
+    )
+
+    assert [entry["book_id"] for entry in result["bookshelf"]] == [2]
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_add_books_to_bookshelf_invalid_statuses(mock_db):
+    with raises_http(400, "Invalid status: bogus, done"):
+        await add_books_to_bookshelf(
+            username="anna",
+            entries=entries((1, "done"), (2, "bogus"), (3, "read"), (4, "done")),
+            db=mock_db,
+            current_user=Mock(),
+        )
+    mock_db.scalar.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_add_books_to_bookshelf_user_not_found(mock_db):
+    mock_db.scalar.return_value = None
+    with raises_http(404, "User not found"):
+        await add_books_to_bookshelf(
+            username="ghost",
+            entries=entries((1, "read")),
+            db=mock_db,
+            current_user=Mock(),
+        )
+    mock_db.execute.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_add_books_to_bookshelf_missing_books(mock_db):
+    mock_db.scalar.return_value = 7
+    mock_db.execute.return_value = BOOK_ROWS
+    with raises_http(404, "Books not found: 3, 5"):
+        await add_books_to_bookshelf(
+            username="anna",
+            entries=entries((5, "read"), (1, "read"), (3, "read")),
+            db=mock_db,
+            current_user=Mock(),
+        )
+    mock_db.scalars.assert_not_awaited()
+    mock_db.commit.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_add_books_to_bookshelf_empty_payload(mock_db):
+    mock_db.scalar.return_value = 7
+    mock_db.execute.return_value = []
+
+    result = await add_books_to_bookshelf(
+        username="anna", entries=[], db=mock_db, current_user=Mock()
+    )
+
+    assert result == {"username": "anna", "bookshelf": []}
+    mock_db.scalars.assert_not_awaited()
+
+SHELF_VERSION = (2, 11, datetime(2024, 5, 1, 9, 30))
+SHELF_ROWS = [{"id": 10, "book_id": 1, "title": "Dune", "author": "Herbert", "status": "read"}]
+
+def bookshelf_queries(version):
+    rows = Mock(mappings=Mock(return_value=Mock(all=Mock(return_value=SHELF_ROWS))))
+    return [Mock(one=Mock(return_value=version)), rows]
+
+async def fetch_bookshelf(mock_db, version, headers=None):
+    mock_db.scalar.return_value = 7
+    mock_db.execute.side_effect = bookshelf_queries(version)
+    response = Mock(headers={})
+    result = await get_user_bookshelf(
+        request=Mock(headers=headers or {}),
+        response=response,
+        username="anna",
+        db=mock_db,
+        current_user=Mock(),
+    )
+    return result, response
+
+@pytest.mark.asyncio
+async def test_get_user_bookshelf_sets_etag_from_version(mock_db):
+    result, response = await fetch_bookshelf(mock_db, SHELF_VERSION)
+
+    assert result == {"username": "anna", "bookshelf": SHELF_ROWS}
+    # Entry count, newest id and latest update together identify the shelf's state.
+    assert response.headers["ETag"] == make_etag("bookshelf", "anna", 7, *SHELF_VERSION)
+    assert mock_db.execute.await_count == 2
+
+@pytest.mark.asyncio
+async def test_get_user_bookshelf_not_modified(mock_db):
+    etag = make_etag("bookshelf", "anna", 7, *SHELF_VERSION)
+
+    result, _ = await fetch_bookshelf(mock_db, SHELF_VERSION, {"if-none-match": etag})
+
+    assert result.status_code == 304
+    assert result.headers["etag"] == etag
+    # Only the version probe runs; the rows are never fetched.
+    mock_db.execute.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_get_user_bookshelf_etag_changes_after_status_update(mock_db):
+    _, before = await fetch_bookshelf(mock_db, SHELF_VERSION)
+    mock_db.reset_mock(return_value=True, side_effect=True)
+    # A status change leaves count and max(id) alone but bumps updated_at.
+    updated = (2, 11, datetime(2024, 5, 2, 8, 0))
+
+    result, after = await fetch_bookshelf(
+        mock_db, updated, {"if-none-match": before.headers["ETag"]}
+    )
+
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert result == {"username": "anna", "bookshelf": SHELF_ROWS}
+
+@pytest.mark.asyncio
+async def test_get_user_bookshelf_user_not_found(mock_db):
+    mock_db.scalar.return_value = None
+    with raises_http(404, "User not found"):
+        await get_user_bookshelf(
+            request=Mock(headers={}),
+            response=Mock(headers={}),
+            username="ghost",
+            db=mock_db,
+            current_user=Mock(),
+        )
+    mock_db.execute.assert_not_awaited()
+
+def user_update(username="annabel", email="anna@example.com"):
+    return UserCreate(username=username, email=email, password="secret1")
+
+@pytest.mark.asyncio
+async def test_update_user_returns_updated_row(mock_db):
+    updated = FakeUser(1, "annabelle", "annabelle@example.com")
+    mock_db.get.return_value = ANNA
+    mock_db.execute.return_value = Mock(one=Mock(return_value=(False, False)))
+    mock_db.scalar.return_value = updated
+
+    result = await update_user(
+        id=1,
+        user_update=user_update("annabelle", "annabelle@example.com"),
+        db=mock_db,
+        current_user=Mock(),
+    )
+
+    assert result is updated
+    stmt = mock_db.scalar.await_args.args[0]
+    params = stmt.compile().params
+    assert params["username"] == "annabelle"
+    assert params["email"] == "annabelle@example.com"
+    assert "RETURNING" in str(stmt.compile(dialect=async_engine.dialect))
+    # Overwrites the identity-map copy loaded by db.get instead of keeping stale values.
+    assert mock_db.scalar.await_args.kwargs["execution_options"] == {"populate_existing": True}
+    mock_db.refresh.assert_not_awaited()
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_update_user_unchanged_skips_exists_checks(mock_db):
+    mock_db.get.return_value = ANNA
+    mock_db.scalar.return_value = ANNA
+
+    result = await update_user(id=1, user_update=user_update(), db=mock_db, current_user=Mock())
+
+    assert result is ANNA
+    mock_db.execute.assert_not_awaited()
+    mock_db.commit.assert_awaited_once()
+
+@pytest.mark.parametrize(
+    "taken,update,detail",
+    [
+        ((True, False), {"username": "bobby"}, "Username already exists."),
+        ((False, True), {"email": "bob@example.com"}, "Email already exists."),
+        (
+            (True, True),
+            {"username": "bobby", "email": "bob@example.com"},
+            "Username already exists.",
+        ),
+    ],
+)
+@pytest.mark.asyncio
+async def test_update_user_rejects_taken_values(taken, update, detail, mock_db):
+    mock_db.get.return_value = ANNA
+    mock_db.execute.return_value = Mock(one=Mock(return_value=taken))
+    with raises_http(400, detail):
+        await update_user(id=1, user_update=user_update(**update), db=mock_db, current_user=Mock())
+    mock_db.scalar.assert_not_awaited()
+    mock_db.commit.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_update_user_not_found(mock_db):
+    mock_db.get.return_value = None
+    with raises_http(404, "User not found"):
+        await update_user(id=9, user_update=user_update(), db=mock_db, current_user=Mock())
+    mock_db.execute.assert_not_awaited()
+
+@pytest_asyncio.fixture
+async def sqlite_db():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        db.add(models.User(username="annabel", email="anna@example.com", hashed_password="x"))
+        await db.commit()
+        yield db
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_update_user_returning_refreshes_loaded_instance(sqlite_db):
+    loaded = await sqlite_db.get(models.User, 1)
+
+    result = await update_user(
+        id=1,
+        user_update=user_update("annabelle", "annabelle@example.com"),
+        db=sqlite_db,
+        current_user=Mock(),
+    )
+
+    # The RETURNING row is the instance already loaded, carrying the new values.
+    assert result is loaded
+    assert (result.username, result.email) == ("annabelle", "annabelle@example.com")
+    assert result.updated_at is not None
+    stored = (
+        await sqlite_db.execute(select(models.User.username, models.User.email))
+    ).one()
+    assert tuple(stored) == ("annabelle", "annabelle@example.com")